@@ -1,62 +1,76 @@
 from PIL import Image
 import os
+from lookup_tables import corner_mask, diff_mask, pair_average, CORNER_OFFSET, DIFF_OFFSET
+
+# progress (optional) is a progress.Progress: stages report to it every few
+# columns and stop with progress.Cancelled once its token is cancelled
 
 # CITE: PIL Docs https://pillow.readthedocs.io/en/stable/reference/Image.html#PIL.Image.new
 # HELP: Used to create an empty image 4x as large as the original
 
-def highResUpscale(image):
+def highResUpscale(image, progress=None):
     
-    output = brighten(extraSmoothing(lowResUpscale(image)))
+    output = brighten(extraSmoothing(lowResUpscale(image, progress), progress), progress)
     return output
 
-def lowResUpscale(image):
+def lowResUpscale(image, progress=None):
     
-    output = overlay(leftoverPixels(smooth(image, 10)), leftoverPixels2(upscale(image),20))
+    output = overlay(leftoverPixels(smooth(image, 10, progress), progress), leftoverPixels2(upscale(image, progress),20, progress), progress)
     return output
 
-def extraSmoothing(image):
+def extraSmoothing(image, progress=None):
     
-    output = overlay(leftoverPixels(smooth(image, 40)), leftoverPixels2(upscale(image),100))
+    output = overlay(leftoverPixels(smooth(image, 40, progress), progress), leftoverPixels2(upscale(image, progress),100, progress), progress)
     return output
     
-def upscale(image):
+def upscale(image, progress=None):
     
     image_out = Image.new('RGB', (image.width*2, image.height*2))
     for x in range(image.width):
+        if progress is not None and x % progress.every == 0:
+            progress.update('upscale', x, image.width)
         for y in range(image.height):
             (r,g,b) = image.getpixel((x, y))
             image_out.putpixel((x*2, y*2),(r,g,b))
             image_out.putpixel((x*2-1, y*2-1),(r,g,b))
             image_out.putpixel((x*2, y*2-1),(r,g,b))
             image_out.putpixel((x*2-1, y*2),(r,g,b))
+    if progress is not None:
+        progress.end('upscale')
     return image_out
 
-def corners(p1,p2,p3,source_image,scale,copied_out,origin):
+def corners(p1,p2,p3,source_image,mask,copied_out,origin):
     
     (r1,g1,b1) = source_image.getpixel(p1)
     (r2,g2,b2) = source_image.getpixel(p2)
     (r3,g3,b3) = source_image.getpixel(p3)
-    redavg = (r1+r2+r3)/3
-    greenavg = (g1+g2+g3)/3
-    blueavg = (b1+b2+b3)/3
-    if abs(redavg - source_image.getpixel(p2)[0]) < scale and abs(greenavg - source_image.getpixel(p2)[1]) < scale and abs(blueavg - source_image.getpixel(p2)[2]) < scale:
-        copied_out.putpixel(origin,source_image.getpixel(p2))
+    # mask is corner_mask(scale): abs((c1+c2+c3)/3 - c2) < scale on each channel
+    if mask[r1+r3-2*r2+CORNER_OFFSET] and mask[g1+g3-2*g2+CORNER_OFFSET] and mask[b1+b3-2*b2+CORNER_OFFSET]:
+        copied_out.putpixel(origin,(r2,g2,b2))
 
-def smooth(image,scale):
+def smooth(image,scale,progress=None):
             
     source_image = upscale(image)
     copied_out = upscale(image)
+    # Fetched once per stage, not per pixel
+    mask = corner_mask(scale)
     for x in range(1,image.width-1):
+        if progress is not None and x % progress.every == 0:
+            progress.update('smooth', x, image.width)
         for y in range(1,image.height-1):
-            corners((x*2, y*2+1),(x*2+1, y*2+1),(x*2+1, y*2),source_image,scale,copied_out,(x*2, y*2))
-            corners((x*2-1, y*2-2),(x*2-2, y*2-2),(x*2-2, y*2-1),source_image,scale,copied_out,(x*2-1, y*2-1))
-            corners((x*2-1, y*2+1),(x*2-2, y*2+1),(x*2-2, y*2),source_image,scale,copied_out,(x*2-1, y*2))
-            corners((x*2+1, y*2-1),(x*2+1, y*2-2),(x*2, y*2-2),source_image,scale,copied_out,(x*2, y*2-1))
+            corners((x*2, y*2+1),(x*2+1, y*2+1),(x*2+1, y*2),source_image,mask,copied_out,(x*2, y*2))
+            corners((x*2-1, y*2-2),(x*2-2, y*2-2),(x*2-2, y*2-1),source_image,mask,copied_out,(x*2-1, y*2-1))
+            corners((x*2-1, y*2+1),(x*2-2, y*2+1),(x*2-2, y*2),source_image,mask,copied_out,(x*2-1, y*2))
+            corners((x*2+1, y*2-1),(x*2+1, y*2-2),(x*2, y*2-2),source_image,mask,copied_out,(x*2, y*2-1))
+    if progress is not None:
+        progress.end('smooth')
     return copied_out
 
-def leftoverPixels(image):
+def leftoverPixels(image, progress=None):
     image_out = image.copy()
     for x in range(1,image.width-1):
+        if progress is not None and x % progress.every == 0:
+            progress.update('leftoverPixels', x, image.width)
         for y in range(1,image.height-1):
             if image.getpixel((x+1, y)) == image.getpixel((x, y+1)) != image.getpixel((x+1, y+1)):
                 image_out.putpixel((x, y),image.getpixel((x+1, y)))
@@ -66,54 +80,74 @@ def leftoverPixels(image):
                 image_out.putpixel((x, y),image.getpixel((x-1, y)))
             elif image.getpixel((x+1, y)) == image.getpixel((x, y-1)) != image.getpixel((x+1, y-1)):
                 image_out.putpixel((x, y),image.getpixel((x+1, y)))
+    if progress is not None:
+        progress.end('leftoverPixels')
     return image_out
 
-def putAverageColor(image_in,image_out,p1,p2,p3,scale2,origin):
+def putAverageColor(image_in,image_out,p1,p2,p3,mask,average,origin):
     
+    # p3 is part of the neighbourhood but only p1 and p2 are averaged
     colors1 = image_in.getpixel(p1)
     colors2 = image_in.getpixel(p2)
-    colors3 = image_in.getpixel(p3)
-    Ravg = round((colors1[0] + colors2[0])/2)
-    Bavg = round((colors1[1] + colors2[1])/2)
-    Gavg = round((colors1[2] + colors2[2])/2)
-    combinedColor = (Ravg, Bavg, Gavg)
-    if abs(colors1[0] - colors2[0]) < scale2 and abs(colors1[1] - colors2[1]) < scale2 and abs(colors1[2] - colors2[2]) < scale2:
+    # Table lookups: mask is diff_mask(scale2), abs(c1 - c2) < scale2, and
+    # average is pair_average(), round((c1 + c2)/2)
+    if mask[colors1[0]-colors2[0]+DIFF_OFFSET] and mask[colors1[1]-colors2[1]+DIFF_OFFSET] and mask[colors1[2]-colors2[2]+DIFF_OFFSET]:
+        combinedColor = (average[colors1[0]+colors2[0]], average[colors1[1]+colors2[1]], average[colors1[2]+colors2[2]])
         image_out.putpixel(origin,combinedColor)
 
-def leftoverPixels2(image,scale2):
+def leftoverPixels2(image,scale2,progress=None):
     image_out = image.copy()
+    # Fetched once per stage, not per pixel
+    mask = diff_mask(scale2)
+    average = pair_average()
     for x in range(1,image.width-1):
+        if progress is not None and x % progress.every == 0:
+            progress.update('leftoverPixels2', x, image.width)
         for y in range(1,image.height-1):
-            putAverageColor(image,image_out,(x+1, y),(x, y+1),(x+1, y+1),scale2,(x,y))
-            putAverageColor(image,image_out,(x-1, y),(x, y-1),(x-1, y-1),scale2,(x,y))
-            putAverageColor(image,image_out,(x-1, y),(x, y+1),(x-1, y+1),scale2,(x,y))
-            putAverageColor(image,image_out,(x+1, y),(x, y-1),(x+1, y-1),scale2,(x,y))
+            putAverageColor(image,image_out,(x+1, y),(x, y+1),(x+1, y+1),mask,average,(x,y))
+            putAverageColor(image,image_out,(x-1, y),(x, y-1),(x-1, y-1),mask,average,(x,y))
+            putAverageColor(image,image_out,(x-1, y),(x, y+1),(x-1, y+1),mask,average,(x,y))
+            putAverageColor(image,image_out,(x+1, y),(x, y-1),(x+1, y-1),mask,average,(x,y))
+    if progress is not None:
+        progress.end('leftoverPixels2')
     return image_out
                 
-def overlay(image1,image2):
+def overlay(image1,image2,progress=None):
     image_out = image1.copy()
     for x in range(image1.width):
+        if progress is not None and x % progress.every == 0:
+            progress.update('overlay', x, image1.width)
         for y in range(image1.height):
             r = round((image1.getpixel((x, y))[0] + image2.getpixel((x, y))[0])/2)
             g = round((image1.getpixel((x, y))[1] + image2.getpixel((x, y))[1])/2)
             b = round((image1.getpixel((x, y))[2] + image2.getpixel((x, y))[2])/2)
             image_out.putpixel((x, y),(r,g,b))
+    if progress is not None:
+        progress.end('overlay')
     return image_out
 
-def brighten(image):
+def brighten(image, progress=None):
     image_out = image.copy()
     for x in range(image.width):
+        if progress is not None and x % progress.every == 0:
+            progress.update('brighten', x, image.width)
         for y in range(image.height):
             r = image.getpixel((x, y))[0]
             g = image.getpixel((x, y))[1]
             b = image.getpixel((x, y))[2]
             image_out.putpixel((x, y),(r+4,g+4,b+4))
+    if progress is not None:
+        progress.end('brighten')
     return image_out
 
 def createCustomGif(image_paths, output_filename='custom.gif', duration=75):
     """
     Create a GIF from a list of image file paths.
     
+    Frames are upscaled by this module's own pipeline (the reference
+    engine), inline, and written one at a time (see animation_stream), so
+    memory use doesn't grow with the number of frames.
+    
     Args:
         image_paths (list): List of file paths to images
         output_filename (str): Name of the output GIF file
@@ -123,17 +157,12 @@ def createCustomGif(image_paths, output_filename='custom.gif', duration=75):
         str: Path to the created GIF file, or None if error
     """
     try:
-        images = []
-        for image_path in image_paths:
-            if os.path.exists(image_path):
-                images.append(highResUpscale(Image.open(image_path)))
-            else:
-                print(f"Warning: Image file not found: {image_path}")
-                continue
+        # Imported here so this module doesn't pull in the engine layer
+        import animation_stream
+        frames = animation_stream.stream_animation(image_paths, output_filename, engine_name='reference',
+                                                   workers=1, default_duration=duration)
         
-        if images:
-            images[0].save(output_filename, save_all=True, append_images=images[1:], 
-                         optimize=False, duration=duration, loop=0)
+        if frames:
             return output_filename
         else:
             print("No valid images found to create GIF")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Request limits and admission control for the processing endpoints
+Bodies and input dimensions are checked before any pixel is decoded, and an
+admission controller keeps the amount of queued work under a budget,
+answering 429/503 with Retry-After instead of letting requests pile up.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from service_response import RequestError
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+# Uploads are base64 JSON, so 16 MiB covers the 10 MB files script.js allows
+MAX_BODY_BYTES = _env_int('MAX_BODY_BYTES', 16 * 1024 * 1024)
+MAX_INPUT_DIMENSION = _env_int('MAX_INPUT_DIMENSION', 1024)
+MAX_INPUT_PIXELS = _env_int('MAX_INPUT_PIXELS', 256 * 256)
+MAX_INPUT_FRAMES = _env_int('MAX_INPUT_FRAMES', 256)
+
+# Work is measured in input pixels; a character GIF is roughly ten 64x64 frames
+GIF_WORK_ESTIMATE = _env_int('GIF_WORK_ESTIMATE', 10 * 64 * 64)
+
+def check_body_size(length):
+    """Reject request bodies larger than MAX_BODY_BYTES with a 413"""
+    if length > MAX_BODY_BYTES:
+        raise RequestError(413, f"Request body too large: {length} bytes (limit {MAX_BODY_BYTES})")
+
+def check_image_size(width, height):
+    """
+    Reject images whose dimensions exceed the configured limits.
+
+    Call this with the size from the image header (PIL's Image.open only
+    reads the header), before any pixel data is decoded.
+
+    Args:
+        width (int): Input width in pixels
+        height (int): Input height in pixels
+    """
+    if width > MAX_INPUT_DIMENSION or height > MAX_INPUT_DIMENSION:
+        raise RequestError(413, f"Image too large: {width}x{height} pixels "
+                                f"(limit {MAX_INPUT_DIMENSION} per side)")
+    if width * height > MAX_INPUT_PIXELS:
+        raise RequestError(413, f"Image too large: {width * height} pixels "
+                                f"(limit {MAX_INPUT_PIXELS})")
+
+def check_frame_count(frames):
+    """Reject animations with more than MAX_INPUT_FRAMES frames with a 413"""
+    if frames > MAX_INPUT_FRAMES:
+        raise RequestError(413, f"Animation too long: {frames} frames (limit {MAX_INPUT_FRAMES})")
+
+class AdmissionController:
+    """
+    Concurrency-aware admission for expensive jobs.
+
+    At most max_concurrent jobs run at once. Jobs beyond that wait, but only
+    while the total estimated work (running plus waiting) stays within
+    max_queued_work; past that a job is rejected with 429. A job that waits
+    longer than timeout seconds for a slot is rejected with 503. Both carry a
+    Retry-After estimated from the measured throughput.
+    """
+
+    def __init__(self, max_concurrent, max_queued_work, timeout=30.0):
+        self.max_concurrent = max_concurrent
+        self.max_queued_work = max_queued_work
+        self.timeout = timeout
+        self.slots = threading.Semaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.queued_work = 0
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Work units per second, smoothed over completed jobs
+        self.throughput = None
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained"""
+        with self.lock:
+            if not self.throughput:
+                return 1
+            return max(1, round(self.queued_work / (self.throughput * self.max_concurrent)))
+
+    def _reject(self, status, message):
+        with self.lock:
+            self.rejected += 1
+        raise RequestError(status, message, {'Retry-After': str(self.retry_after())})
+
+    @contextmanager
+    def admit(self, cost):
+        """
+        Hold a slot for a job of the given cost while the block runs.
+
+        Args:
+            cost (int): Estimated work, in input pixels
+        """
+        with self.lock:
+            over_budget = self.queued_work > 0 and self.queued_work + cost > self.max_queued_work
+            if not over_budget:
+                self.queued_work += cost
+                self.waiting += 1
+        if over_budget:
+            self._reject(429, "Server busy: too much queued work, retry later")
+
+        acquired = self.slots.acquire(timeout=self.timeout)
+        with self.lock:
+            self.waiting -= 1
+            if acquired:
+                self.running += 1
+            else:
+                self.queued_work -= cost
+        if not acquired:
+            self._reject(503, "Server busy: timed out waiting for a worker, retry later")
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.running -= 1
+                self.queued_work -= cost
+                if elapsed > 0 and cost > 0:
+                    rate = cost / elapsed
+                    self.throughput = rate if self.throughput is None else 0.8 * self.throughput + 0.2 * rate
+            self.slots.release()
+
+    def stats(self):
+        """Return current load and rejection counters"""
+        with self.lock:
+            return {
+                'running': self.running,
+                'waiting': self.waiting,
+                'queuedWork': self.queued_work,
+                'rejected': self.rejected,
+                'throughput': round(self.throughput or 0, 1),
+            }
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_admission_controller():
+    """Return the process-wide admission controller, configured from the environment"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                _env_int('MAX_CONCURRENT_JOBS', os.cpu_count() or 1),
+                _env_int('MAX_QUEUED_WORK', 4 * MAX_INPUT_PIXELS),
+                float(os.environ.get('ADMISSION_TIMEOUT', 30)))
+        return _controller
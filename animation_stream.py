@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Streaming animation upscaler
+createCustomGif-style processing keeps every upscaled frame in a list until
+the GIF is saved, so memory grows with the frame count. Here frames are read
+lazily (from a multi-frame GIF/APNG, a directory of frames or a list of
+paths), upscaled in a worker pool with a bounded window of frames in flight,
+and each result is written out as soon as it is ready, so memory depends on
+the window size rather than the length of the animation.
+
+Video is handled by extracting frames to a directory first, e.g.
+ffmpeg -i clip.mp4 frames/%05d.png.
+
+Usage: python animation_stream.py input.gif|frames/ output.gif|out_frames/ [--engine NAME]
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image, GifImagePlugin
+
+from engines import get_engine, get_worker_pool, discard_worker_pool, POOL_ERRORS
+
+# Frame duration (ms) when the source doesn't carry one, as in createCustomGif
+DEFAULT_DURATION = 75
+
+FRAME_EXTENSIONS = ('.png', '.gif', '.bmp', '.jpg', '.jpeg', '.webp')
+
+def _upscale_frame(engine_name, image):
+    """Worker entry point: run highResUpscale on one frame"""
+    return get_engine(engine_name).highResUpscale(image)
+
+def _open_rgb(path):
+    with Image.open(path) as image:
+        return image.convert('RGB')
+
+def iter_frames(source, default_duration=DEFAULT_DURATION):
+    """
+    Lazily yield the frames of an animation.
+
+    Args:
+        source: An animated image path, a directory of frame images (in name
+            order) or a list of frame image paths
+        default_duration (int): Duration (ms) for frames without one
+
+    Yields:
+        tuple: (PIL.Image.Image, int) an RGB frame and its duration in ms
+    """
+    durations = []
+    if isinstance(source, (list, tuple)):
+        paths = source
+    elif os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in sorted(os.listdir(source))
+                 if name.lower().endswith(FRAME_EXTENSIONS)]
+        # Directories written by FrameDirectoryWriter carry their durations
+        durations_path = os.path.join(source, 'durations.json')
+        if os.path.exists(durations_path):
+            with open(durations_path) as f:
+                durations = json.load(f).get('durations', [])
+    else:
+        with Image.open(source) as animation:
+            yield from iter_image_frames(animation, default_duration)
+        return
+
+    for index, path in enumerate(paths):
+        if not os.path.exists(path):
+            print(f"Warning: Image file not found: {path}")
+            continue
+        yield _open_rgb(path), durations[index] if index < len(durations) else default_duration
+
+def iter_image_frames(animation, default_duration=DEFAULT_DURATION):
+    """Lazily yield (RGB frame, duration) pairs from an opened multi-frame image"""
+    for index in range(getattr(animation, 'n_frames', 1)):
+        # Seeking in order lets Pillow apply each frame's disposal
+        animation.seek(index)
+        yield animation.convert('RGB'), animation.info.get('duration') or default_duration
+
+def upscale_frames(frames, engine_name=None, prefetch=None, workers=None):
+    """
+    Upscale a stream of frames, yielding results in order as they finish.
+
+    At most prefetch frames are read ahead and queued in the worker pool;
+    reading the next frame waits until the oldest one has been handed on.
+
+    Args:
+        frames: Iterable of (image, duration) pairs, e.g. from iter_frames
+        engine_name (str): Smoothing engine (optional, defaults to the selected one)
+        prefetch (int): Frames in flight (optional, defaults to ANIMATION_PREFETCH or 2 per worker)
+        workers (int): Whether to use the shared worker pool (2 or more) and
+            the default prefetch (optional, defaults to ANIMATION_WORKERS or the CPU count)
+
+    Yields:
+        tuple: (PIL.Image.Image, int) the upscaled frame and its duration
+    """
+    engine = get_engine(engine_name)
+    workers = workers or int(os.environ.get('ANIMATION_WORKERS', os.cpu_count() or 1))
+    prefetch = max(1, prefetch or int(os.environ.get('ANIMATION_PREFETCH', 2 * workers)))
+    pool = None
+    if workers > 1:
+        try:
+            pool = get_worker_pool()
+        except POOL_ERRORS as e:
+            print(f"Animation upscaler falling back to inline execution: {e}")
+
+    pending = deque()
+
+    def oldest():
+        # A pool whose worker died is dropped; its queued frames run inline
+        nonlocal pool
+        future, image, duration = pending.popleft()
+        try:
+            return future.result(), duration
+        except BrokenProcessPool as e:
+            if pool is not None:
+                print(f"Animation upscaler falling back to inline execution: {e}")
+                discard_worker_pool(pool)
+                pool = None
+            return engine.highResUpscale(image), duration
+
+    for image, duration in frames:
+        if pool is not None:
+            try:
+                pending.append((pool.submit(_upscale_frame, engine.name, image), image, duration))
+            except POOL_ERRORS as e:
+                print(f"Animation upscaler falling back to inline execution: {e}")
+                if isinstance(e, BrokenProcessPool):
+                    discard_worker_pool(pool)
+                pool = None
+        if pool is None:
+            while pending:
+                yield oldest()
+            yield engine.highResUpscale(image), duration
+        elif len(pending) >= prefetch:
+            yield oldest()
+    while pending:
+        yield oldest()
+
+class GifStreamWriter:
+    """
+    Writes a GIF one frame at a time.
+
+    Pillow's save(save_all=True) collects every frame before writing, so
+    this writes the header with the first frame, appends each later frame
+    with its own local palette, and writes the trailer on close. output is a
+    path or a binary file object; a loop of None plays the animation once.
+    """
+
+    def __init__(self, output, loop=0):
+        self.output = output
+        self.loop = loop
+        self.frames = 0
+        self.file = None
+
+    def write(self, image, duration=DEFAULT_DURATION):
+        frame = image.convert('P', palette=Image.Palette.ADAPTIVE)
+        if self.frames == 0:
+            # Opened on the first frame so an empty animation leaves no file
+            self.file = self.output if hasattr(self.output, 'write') else open(self.output, 'wb')
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': self.loop, 'duration': duration})
+            self.file.writelines(header)
+            data = GifImagePlugin.getdata(frame, duration=duration)
+        else:
+            data = GifImagePlugin.getdata(frame, duration=duration, include_color_table=True)
+        self.file.writelines(data)
+        self.frames += 1
+
+    def close(self):
+        if self.file is not None and not self.file.closed:
+            self.file.write(b';')
+            if self.file is not self.output:
+                self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class FrameDirectoryWriter:
+    """Writes each frame as a numbered PNG, with durations.json listing frame durations"""
+
+    def __init__(self, directory, loop=0):
+        self.directory = directory
+        self.loop = loop
+        self.frames = 0
+        self.durations = []
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, image, duration=DEFAULT_DURATION):
+        image.save(os.path.join(self.directory, f'{self.frames:05d}.png'))
+        self.durations.append(duration)
+        self.frames += 1
+
+    def close(self):
+        with open(os.path.join(self.directory, 'durations.json'), 'w') as f:
+            json.dump({'loop': self.loop, 'durations': self.durations}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_writer(output, loop=0):
+    """GifStreamWriter for a .gif path, FrameDirectoryWriter otherwise"""
+    if output.lower().endswith('.gif'):
+        return GifStreamWriter(output, loop)
+    return FrameDirectoryWriter(output, loop)
+
+def stream_animation(source, output, engine_name=None, loop=0, prefetch=None, workers=None,
+                     default_duration=DEFAULT_DURATION):
+    """
+    Upscale an animation from source to output, one frame at a time.
+
+    Args:
+        source: Animated image path, frame directory or list of frame paths
+        output (str): Output .gif path or frame directory
+        engine_name (str): Smoothing engine (optional)
+        loop (int): GIF loop count, 0 to loop forever
+        prefetch (int): Frames in flight (optional)
+        workers (int): Worker processes (optional)
+        default_duration (int): Duration (ms) for frames without one
+
+    Returns:
+        int: Number of frames written
+    """
+    frames = upscale_frames(iter_frames(source, default_duration), engine_name, prefetch, workers)
+    with open_writer(output, loop) as writer:
+        for image, duration in frames:
+            writer.write(image, duration)
+    return writer.frames
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='Animated GIF/APNG or a directory of frames')
+    parser.add_argument('output', help='Output .gif, or a directory for PNG frames')
+    parser.add_argument('--engine', help='Smoothing engine (default: selected engine)')
+    parser.add_argument('--loop', type=int, default=0, help='GIF loop count, 0 loops forever')
+    parser.add_argument('--prefetch', type=int, help='Frames in flight')
+    parser.add_argument('--workers', type=int, help='Worker processes')
+    args = parser.parse_args(argv)
+
+    count = stream_animation(args.source, args.output, args.engine, args.loop, args.prefetch, args.workers)
+    print(f"Wrote {count} frames to {args.output}")
+    return 0 if count else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Raw-buffer smoothing engine
+Runs the Project5 pipeline on PixelBuffers: stages index channel bytes in
+flat bytearrays, so no tuple or PIL object is created per pixel, and each
+stage can write into a caller-supplied output buffer instead of allocating.
+PIL is only used to convert at the start and end of highResUpscale.
+Intermediates of the composed stages come from, and go back to, the shared
+buffer pool. Pure Python, no optional dependencies.
+"""
+
+import operator
+
+from engines import Engine, DEFAULT_THRESHOLDS
+from pixel_buffer import PixelBuffer, check_output
+from buffer_pool import get_buffer_pool
+from progress import staged
+from lookup_tables import corner_mask, diff_mask, pair_average, CORNER_OFFSET, DIFF_OFFSET
+
+# brighten adds 4 per channel and putpixel clamps at 255
+_BRIGHTEN = bytes(min(value + 4, 255) for value in range(256))
+
+def upscale_buffer(src, out=None):
+    """
+    2x nearest-neighbour upscale, matching Project5.upscale.
+
+    Output column X comes from input column (X + 1) // 2, except the last
+    column, which wraps to column 0 (upscale writes to x*2-1 at x=0); rows
+    work the same way.
+    """
+    width, height = src.width, src.height
+    out = check_output(out, width * 2, height * 2)
+    data, out_data = src.data, out.data
+    stride, out_stride = width * 3, width * 6
+
+    row = bytearray(out_stride)
+    for y in range(height):
+        source_row = data[y * stride:(y + 1) * stride]
+        # Odd output columns 1, 3, ..., 2w-1 take input columns 1, 2, ..., w-1, 0
+        rotated = source_row[3:] + source_row[:3]
+        for channel in range(3):
+            row[channel::6] = source_row[channel::3]
+            row[3 + channel::6] = rotated[channel::3]
+        # Input row y fills output rows 2y and 2y-1 (row -1 wraps to the last)
+        even = 2 * y * out_stride
+        odd = (2 * y - 1) % (2 * height) * out_stride
+        out_data[even:even + out_stride] = row
+        out_data[odd:odd + out_stride] = row
+    return out
+
+def _corner(source, out, origin, p1, p2, p3, mask):
+    # mask is corner_mask(scale), indexed by c1 + c3 - 2 * c2 (offset)
+    r = source[p2]
+    g = source[p2 + 1]
+    b = source[p2 + 2]
+    if (mask[source[p1] + source[p3] - 2 * r + CORNER_OFFSET]
+            and mask[source[p1 + 1] + source[p3 + 1] - 2 * g + CORNER_OFFSET]
+            and mask[source[p1 + 2] + source[p3 + 2] - 2 * b + CORNER_OFFSET]):
+        out[origin] = r
+        out[origin + 1] = g
+        out[origin + 2] = b
+
+def smooth_buffer(src, scale, out=None, scratch=None, progress=None):
+    """
+    Upscale and round off corners, matching Project5.smooth.
+
+    Args:
+        src (PixelBuffer): Input
+        scale (int): Corner threshold
+        out (PixelBuffer): Output buffer to reuse (optional)
+        scratch (PixelBuffer): Buffer for the upscaled source (optional); it
+            still holds upscale(src) afterwards, so callers can reuse it
+        progress (Progress): Reported to every few rows (optional)
+    """
+    width, height = src.width, src.height
+    source = upscale_buffer(src, scratch)
+    out = source.copy(check_output(out, width * 2, height * 2))
+    s, o = source.data, out.data
+    mask = corner_mask(scale)
+    row = width * 6
+    for y in range(1, height - 1):
+        if progress is not None and y % progress.every == 0:
+            progress.update('smooth', y, height)
+        for x in range(1, width - 1):
+            i = 2 * y * row + 6 * x            # (2x, 2y)
+            _corner(s, o, i, i + row, i + row + 3, i + 3, mask)
+            _corner(s, o, i - row - 3, i - 2 * row - 3, i - 2 * row - 6, i - row - 6, mask)
+            _corner(s, o, i - 3, i + row - 3, i + row - 6, i - 6, mask)
+            _corner(s, o, i - row, i - row + 3, i - 2 * row + 3, i - 2 * row, mask)
+    if progress is not None:
+        progress.end('smooth')
+    return out
+
+def leftover_pixels_buffer(src, out=None, progress=None):
+    """Fill diagonal gaps, matching Project5.leftoverPixels"""
+    width, height = src.width, src.height
+    out = src.copy(check_output(out, width, height))
+    d, o = src.data, out.data
+    row = width * 3
+    for y in range(1, height - 1):
+        if progress is not None and y % progress.every == 0:
+            progress.update('leftoverPixels', y, height)
+        for x in range(1, width - 1):
+            i = (y * width + x) * 3
+            right, left, down, up = i + 3, i - 3, i + row, i - row
+            # a == b != c, checked in the same order as the if/elif chain
+            if (d[right] == d[down] and d[right + 1] == d[down + 1] and d[right + 2] == d[down + 2]
+                    and not (d[down] == d[down + 3] and d[down + 1] == d[down + 4] and d[down + 2] == d[down + 5])):
+                source = right
+            elif (d[left] == d[up] and d[left + 1] == d[up + 1] and d[left + 2] == d[up + 2]
+                    and not (d[up] == d[up - 3] and d[up + 1] == d[up - 2] and d[up + 2] == d[up - 1])):
+                source = left
+            elif (d[left] == d[down] and d[left + 1] == d[down + 1] and d[left + 2] == d[down + 2]
+                    and not (d[down] == d[down - 3] and d[down + 1] == d[down - 2] and d[down + 2] == d[down - 1])):
+                source = left
+            elif (d[right] == d[up] and d[right + 1] == d[up + 1] and d[right + 2] == d[up + 2]
+                    and not (d[up] == d[up + 3] and d[up + 1] == d[up + 4] and d[up + 2] == d[up + 5])):
+                source = right
+            else:
+                continue
+            o[i] = d[source]
+            o[i + 1] = d[source + 1]
+            o[i + 2] = d[source + 2]
+    if progress is not None:
+        progress.end('leftoverPixels')
+    return out
+
+def leftover_pixels2_buffer(src, scale2, out=None, progress=None):
+    """Average neighbour pairs into gaps, matching Project5.leftoverPixels2"""
+    width, height = src.width, src.height
+    out = src.copy(check_output(out, width, height))
+    d, o = src.data, out.data
+    mask, average = diff_mask(scale2), pair_average()
+    row = width * 3
+    for y in range(1, height - 1):
+        if progress is not None and y % progress.every == 0:
+            progress.update('leftoverPixels2', y, height)
+        for x in range(1, width - 1):
+            i = (y * width + x) * 3
+            right, left, down, up = i + 3, i - 3, i + row, i - row
+            # putAverageColor is called for these pairs in order and later
+            # calls overwrite earlier ones, so the last pair that passes wins
+            for a, b in ((right, up), (left, down), (left, up), (right, down)):
+                if (mask[d[a] - d[b] + DIFF_OFFSET]
+                        and mask[d[a + 1] - d[b + 1] + DIFF_OFFSET]
+                        and mask[d[a + 2] - d[b + 2] + DIFF_OFFSET]):
+                    o[i] = average[d[a] + d[b]]
+                    o[i + 1] = average[d[a + 1] + d[b + 1]]
+                    o[i + 2] = average[d[a + 2] + d[b + 2]]
+                    break
+    if progress is not None:
+        progress.end('leftoverPixels2')
+    return out
+
+def overlay_buffer(src1, src2, out=None):
+    """Per-channel rounded mean of two buffers, matching Project5.overlay"""
+    out = check_output(out, src1.width, src1.height)
+    out.data[:] = bytes(map(pair_average().__getitem__, map(operator.add, src1.data, src2.data)))
+    return out
+
+def brighten_buffer(src, out=None):
+    """Add 4 to every channel with clamping, matching Project5.brighten"""
+    out = check_output(out, src.width, src.height)
+    out.data[:] = src.data.translate(_BRIGHTEN)
+    return out
+
+def low_res_buffer(src, scale=10, scale2=20, pool=None, progress=None):
+    """
+    lowResUpscale on buffers, with intermediates taken from the pool.
+
+    Args:
+        src (PixelBuffer): Input
+        scale (int): smooth threshold
+        scale2 (int): leftoverPixels2 threshold
+        pool (BufferPool): Pool to use (optional, defaults to the shared pool)
+        progress (Progress): Reported to every few rows (optional)
+
+    Returns:
+        PixelBuffer: Output owned by the caller, who may release it to the pool
+    """
+    pool = pool or get_buffer_pool()
+    width, height = src.width * 2, src.height * 2
+
+    upscaled = pool.acquire(width, height)
+    smoothed = smooth_buffer(src, scale, pool.acquire(width, height), upscaled, progress)
+    filled = leftover_pixels_buffer(smoothed, pool.acquire(width, height), progress)
+    pool.release(smoothed)
+    # smooth left upscale(src) in its scratch buffer, which is exactly what
+    # leftoverPixels2 starts from
+    if progress is not None:
+        progress.end('upscale')
+    averaged = leftover_pixels2_buffer(upscaled, scale2, pool.acquire(width, height), progress)
+    pool.release(upscaled)
+    out = staged(progress, 'overlay', overlay_buffer, filled, averaged, filled)
+    pool.release(averaged)
+    return out
+
+def high_res_buffer(src, pool=None, progress=None, thresholds=DEFAULT_THRESHOLDS):
+    """highResUpscale on buffers; the result is owned by the caller"""
+    pool = pool or get_buffer_pool()
+    low = low_res_buffer(src, thresholds.scale, thresholds.scale2, pool, progress)
+    out = low_res_buffer(low, thresholds.extra_scale, thresholds.extra_scale2, pool, progress)
+    pool.release(low)
+    return staged(progress, 'brighten', brighten_buffer, out, out)
+
+def _run(function, image, *args, **kwargs):
+    """Convert to a pooled buffer, run a buffer pipeline, convert back and recycle"""
+    pool = get_buffer_pool()
+    src = PixelBuffer.from_image(image, pool.acquire(image.width, image.height))
+    try:
+        out = function(src, *args, **kwargs)
+    finally:
+        pool.release(src)
+    result = out.to_image()
+    pool.release(out)
+    return result
+
+class BufferEngine(Engine):
+    """Pipeline on packed bytearrays, converting to PIL only at the ends"""
+
+    name = 'buffer'
+
+    def highResUpscale(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        return _run(high_res_buffer, image, progress=progress, thresholds=thresholds)
+
+    def lowResUpscale(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        return _run(low_res_buffer, image, thresholds.scale, thresholds.scale2, progress=progress)
+
+    def extraSmoothing(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        return _run(low_res_buffer, image, thresholds.extra_scale, thresholds.extra_scale2, progress=progress)
+
+    def upscale(self, image):
+        return upscale_buffer(PixelBuffer.from_image(image)).to_image()
+
+    def smooth(self, image, scale):
+        return smooth_buffer(PixelBuffer.from_image(image), scale).to_image()
+
+    def leftoverPixels(self, image):
+        return leftover_pixels_buffer(PixelBuffer.from_image(image)).to_image()
+
+    def leftoverPixels2(self, image, scale2):
+        return leftover_pixels2_buffer(PixelBuffer.from_image(image), scale2).to_image()
+
+    def overlay(self, image1, image2):
+        return overlay_buffer(PixelBuffer.from_image(image1), PixelBuffer.from_image(image2)).to_image()
+
+    def brighten(self, image):
+        return brighten_buffer(PixelBuffer.from_image(image)).to_image()
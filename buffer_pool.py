@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Size-keyed pool of pixel buffers
+A highResUpscale call needs about a dozen full-size intermediates. The buffer
+engine takes them from this pool and hands them back when a stage is done,
+so a server processing a steady stream of similar images stops allocating
+large bytearrays after the first few requests.
+"""
+
+import os
+import threading
+
+from pixel_buffer import PixelBuffer
+
+class BufferPool:
+    """
+    Thread-safe pool of bytearrays keyed by byte size.
+
+    Buffers come back with undefined contents; every buffer engine stage
+    overwrites its whole output, so nothing needs clearing.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_per_size=8):
+        self.max_bytes = max_bytes
+        self.max_per_size = max_per_size
+        self.free = {}
+        self.bytes_held = 0
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, width, height):
+        """
+        Get a buffer for a width x height image.
+
+        Args:
+            width (int): Width in pixels
+            height (int): Height in pixels
+
+        Returns:
+            PixelBuffer: A buffer of the right size, reused when possible
+        """
+        size = width * height * 3
+        with self.lock:
+            free = self.free.get(size)
+            if free:
+                data = free.pop()
+                self.bytes_held -= size
+                self.hits += 1
+                return PixelBuffer(width, height, data)
+            self.misses += 1
+        return PixelBuffer(width, height)
+
+    def release(self, buffer):
+        """Return a buffer to the pool; it must not be used afterwards"""
+        size = len(buffer.data)
+        with self.lock:
+            free = self.free.setdefault(size, [])
+            if len(free) >= self.max_per_size or self.bytes_held + size > self.max_bytes:
+                self.dropped += 1
+                return
+            free.append(buffer.data)
+            self.bytes_held += size
+
+    def clear(self):
+        """Drop every pooled buffer"""
+        with self.lock:
+            self.free.clear()
+            self.bytes_held = 0
+
+    def stats(self):
+        """Return hit/miss counters and memory held"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'dropped': self.dropped,
+                'bytesHeld': self.bytes_held,
+                'buffers': sum(len(free) for free in self.free.values()),
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_buffer_pool():
+    """Return the process-wide buffer pool, configured from the environment"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BufferPool(int(os.environ.get('BUFFER_POOL_MAX_BYTES', 64 * 1024 * 1024)),
+                               int(os.environ.get('BUFFER_POOL_MAX_PER_SIZE', 8)))
+        return _pool
@@ -5,17 +5,19 @@ Vercel serverless function for creating GIFs
 
 import os
 import json
-import base64
 import sys
 
 # Add the current directory to the path so we can import Project5
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    from Project5 import samusGif, feiGif, bartGif
-except ImportError as e:
-    print(f"Error importing GIF functions: {e}")
-    sys.exit(1)
+# Project5 and Pillow are imported lazily on the first request so that
+# instance start-up stays cheap
+import warm_cache
+import smoother_service
+import result_cache
+
+# Module loading is the first part of a cold start
+warm_cache.mark_loaded()
 
 def handler(event, context):
     """Main handler for Vercel serverless function"""
@@ -30,6 +32,19 @@ def handler(event, context):
         'Access-Control-Allow-Headers': 'Content-Type'
     }
     
+    # Warm-up ping: load everything now so the next real request is fast
+    if warm_cache.is_warmup_event(event):
+        return {
+            'statusCode': 200,
+            'headers': {**cors_headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({**warm_cache.warm_up(), **warm_cache.report()})
+        }
+    
+    # Any other request means the instance is up; processing requests stop
+    # the cold-start clock once the pipeline has loaded
+    if method != 'POST':
+        warm_cache.mark_ready()
+    
     # Handle preflight requests
     if method == 'OPTIONS':
         return {
@@ -38,8 +53,24 @@ def handler(event, context):
             'body': ''
         }
     
+    # Results cached by this instance can be fetched again by URL
+    if method == 'GET' and result_cache.parse_result_path(event.get('path', '')):
+        return smoother_service.to_vercel_response(
+            result_cache.serve_result(event.get('path', ''), headers), cors_headers)
+    
     if method == 'POST':
-        return handle_create_gif(body, cors_headers)
+        try:
+            cold_start_ms = warm_cache.record_invocation()
+        except ImportError as e:
+            print(f"Error importing GIF functions: {e}")
+            return {
+                'statusCode': 500,
+                'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                'body': json.dumps({'success': False, 'error': str(e)})
+            }
+        response = handle_create_gif(body, cors_headers)
+        response['headers'].update(warm_cache.cold_start_headers(cold_start_ms))
+        return response
     else:
         return {
             'statusCode': 405,
@@ -49,60 +80,4 @@ def handler(event, context):
 
 def handle_create_gif(body, cors_headers):
     """Handle GIF creation requests"""
-    try:
-        # Parse JSON data
-        data = json.loads(body)
-        character = data.get('character')
-        
-        if not character:
-            raise ValueError("No character specified")
-        
-        # Create GIF based on character
-        if character == 'samus':
-            result = samusGif()
-            gif_filename = 'samus.gif'
-        elif character == 'fei':
-            result = feiGif()
-            gif_filename = 'fei.gif'
-        elif character == 'bart':
-            result = bartGif()
-            gif_filename = 'bart.gif'
-        else:
-            raise ValueError(f"Unknown character: {character}")
-        
-        # Read the generated GIF file
-        if result and os.path.exists(gif_filename):
-            with open(gif_filename, 'rb') as f:
-                gif_data = f.read()
-            
-            # Convert to base64
-            gif_base64 = base64.b64encode(gif_data).decode('utf-8')
-            
-            response = {
-                'success': True,
-                'gifData': f'data:image/gif;base64,{gif_base64}',
-                'filename': gif_filename
-            }
-        else:
-            raise Exception("GIF creation failed")
-        
-        return {
-            'statusCode': 200,
-            'headers': {**cors_headers, 'Content-Type': 'application/json'},
-            'body': json.dumps(response)
-        }
-        
-    except Exception as e:
-        print(f"Error creating GIF: {e}")
-        import traceback
-        traceback.print_exc()
-        response = {
-            'success': False,
-            'error': str(e)
-        }
-        
-        return {
-            'statusCode': 500,
-            'headers': {**cors_headers, 'Content-Type': 'application/json'},
-            'body': json.dumps(response)
-        }
+    return smoother_service.to_vercel_response(smoother_service.create_gif(body), cors_headers)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Smoothing engine registry for Pixel Art Smoother
+An engine serves the Project5 pipeline interface (upscale, smooth,
+leftoverPixels, leftoverPixels2, overlay, brighten and the composed
+lowResUpscale / extraSmoothing / highResUpscale) and must match the reference
+implementation pixel for pixel (see golden.py). Engines are imported lazily,
+selected by name, by the SMOOTHER_ENGINE env var, or picked at startup by a
+quick self-benchmark.
+"""
+
+import os
+import time
+import atexit
+import random
+import importlib
+import threading
+import multiprocessing
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from progress import staged
+
+# smooth / leftoverPixels2 thresholds for lowResUpscale (scale, scale2) and
+# extraSmoothing (extra_scale, extra_scale2)
+Thresholds = namedtuple('Thresholds', ['scale', 'scale2', 'extra_scale', 'extra_scale2'])
+
+DEFAULT_THRESHOLDS = Thresholds(10, 20, 40, 100)
+
+class Engine:
+    """
+    Base class for smoothing engines.
+
+    Subclasses implement the six stages; the composed stages below follow
+    Project5 exactly, so an engine only overrides them to avoid converting
+    between representations in the middle of the pipeline. The composed
+    stages take an optional progress.Progress, reported to (and checked for
+    cancellation) at least between stages, and optional Thresholds in place
+    of Project5's fixed ones.
+    """
+
+    name = None
+
+    def highResUpscale(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        low = self.lowResUpscale(image, progress, thresholds)
+        return staged(progress, 'brighten', self.brighten, self.extraSmoothing(low, progress, thresholds))
+
+    def lowResUpscale(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        return self._smoothing_pass(image, thresholds.scale, thresholds.scale2, progress)
+
+    def extraSmoothing(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        return self._smoothing_pass(image, thresholds.extra_scale, thresholds.extra_scale2, progress)
+
+    def _smoothing_pass(self, image, scale, scale2, progress):
+        smoothed = staged(progress, 'leftoverPixels', self.leftoverPixels, staged(progress, 'smooth', self.smooth, image, scale))
+        averaged = staged(progress, 'leftoverPixels2', self.leftoverPixels2, staged(progress, 'upscale', self.upscale, image), scale2)
+        return staged(progress, 'overlay', self.overlay, smoothed, averaged)
+
+    def upscale(self, image):
+        raise NotImplementedError
+
+    def smooth(self, image, scale):
+        raise NotImplementedError
+
+    def leftoverPixels(self, image):
+        raise NotImplementedError
+
+    def leftoverPixels2(self, image, scale2):
+        raise NotImplementedError
+
+    def overlay(self, image1, image2):
+        raise NotImplementedError
+
+    def brighten(self, image):
+        raise NotImplementedError
+
+class ReferenceEngine(Engine):
+    """The original per-pixel implementation in Project5"""
+
+    name = 'reference'
+
+    def __init__(self):
+        import Project5
+        self.pipeline = Project5
+
+    # Project5 hardcodes the default thresholds; other thresholds go through
+    # the base class composition of the same stages
+
+    def highResUpscale(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        if thresholds != DEFAULT_THRESHOLDS:
+            return super().highResUpscale(image, progress, thresholds)
+        return self.pipeline.highResUpscale(image, progress)
+
+    def lowResUpscale(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        if thresholds != DEFAULT_THRESHOLDS:
+            return super().lowResUpscale(image, progress, thresholds)
+        return self.pipeline.lowResUpscale(image, progress)
+
+    def extraSmoothing(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        if thresholds != DEFAULT_THRESHOLDS:
+            return super().extraSmoothing(image, progress, thresholds)
+        return self.pipeline.extraSmoothing(image, progress)
+
+    def upscale(self, image):
+        return self.pipeline.upscale(image)
+
+    def smooth(self, image, scale):
+        return self.pipeline.smooth(image, scale)
+
+    def leftoverPixels(self, image):
+        return self.pipeline.leftoverPixels(image)
+
+    def leftoverPixels2(self, image, scale2):
+        return self.pipeline.leftoverPixels2(image, scale2)
+
+    def overlay(self, image1, image2):
+        return self.pipeline.overlay(image1, image2)
+
+    def brighten(self, image):
+        return self.pipeline.brighten(image)
+
+# Engine name -> (module, class); modules are only imported when the engine is
+# first requested, so optional dependencies cost nothing until then
+ENGINE_CLASSES = {
+    'reference': ('engines', 'ReferenceEngine'),
+    'buffer': ('buffer_engine', 'BufferEngine'),
+    'numpy': ('numpy_engine', 'NumpyEngine'),
+    'tiled': ('tiled_engine', 'TiledEngine'),
+}
+
+DEFAULT_ENGINE = 'reference'
+
+# Size of the one process pool shared by everything that runs work in
+# parallel (tiled bands, sprite-sheet cells, animation frames)
+WORKER_PROCESSES = int(os.environ.get('SMOOTHER_WORKERS', os.cpu_count() or 1))
+
+# Raised when processes can't be started or jobs can't be submitted (e.g.
+# some serverless sandboxes); callers then run their jobs inline. A pool
+# whose worker died raises BrokenProcessPool (a RuntimeError) and is replaced
+POOL_ERRORS = (OSError, RuntimeError)
+
+# The pool is started from request threads, where forking the threaded
+# server could copy a lock held by another thread into the workers, so
+# workers come from a forkserver (spawn where there is none)
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+_instances = {}
+_unavailable = {}
+_selected = {'name': None}
+_lock = threading.RLock()
+
+def register_engine(name, module_name, class_name):
+    """
+    Register an engine class to be imported on first use.
+
+    Args:
+        name (str): Engine name used in SMOOTHER_ENGINE and per-request options
+        module_name (str): Module defining the engine
+        class_name (str): Engine class in that module
+    """
+    ENGINE_CLASSES[name] = (module_name, class_name)
+    _unavailable.pop(name, None)
+
+def _load(name):
+    with _lock:
+        engine = _instances.get(name)
+        if engine is not None or name in _unavailable:
+            return engine
+        module_name, class_name = ENGINE_CLASSES[name]
+        try:
+            engine = getattr(importlib.import_module(module_name), class_name)()
+        except ImportError as e:
+            # Optional dependency missing (e.g. numpy); remember and move on
+            _unavailable[name] = str(e)
+            return None
+        _instances[name] = engine
+        return engine
+
+def available_engines():
+    """Return the names of engines whose dependencies are installed"""
+    return [name for name in ENGINE_CLASSES if _load(name) is not None]
+
+def default_engine_name():
+    """SMOOTHER_ENGINE if set, else the benchmark winner, else the reference engine"""
+    return os.environ.get('SMOOTHER_ENGINE') or _selected['name'] or DEFAULT_ENGINE
+
+def get_engine(name=None):
+    """
+    Get an engine instance.
+
+    Args:
+        name (str): Engine name (optional, defaults to default_engine_name())
+
+    Returns:
+        Engine: The engine
+
+    Raises:
+        ValueError: If the engine is unknown or its dependencies are missing
+    """
+    name = name or default_engine_name()
+    if name not in ENGINE_CLASSES:
+        raise ValueError(f"Unknown engine: {name} (available: {', '.join(ENGINE_CLASSES)})")
+    engine = _load(name)
+    if engine is None:
+        raise ValueError(f"Engine {name} is not available: {_unavailable[name]}")
+    return engine
+
+def _benchmark_image(size=16, seed=5):
+    from PIL import Image
+    rng = random.Random(seed)
+    palette = [(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(6)]
+    image = Image.new('RGB', (size, size))
+    image.putdata([rng.choice(palette) for _ in range(size * size)])
+    return image
+
+def benchmark_engines(names=None, size=16):
+    """
+    Time each engine's highResUpscale on a small sample image.
+
+    Engines whose output differs from the reference engine are reported as
+    mismatched and never selected.
+
+    Args:
+        names (list): Engines to time (optional, defaults to all available)
+        size (int): Width and height of the sample image
+
+    Returns:
+        dict: Engine name -> seconds, or None for a mismatching engine
+    """
+    image = _benchmark_image(size)
+    expected = get_engine('reference').highResUpscale(image).tobytes()
+    results = {}
+    for name in names or available_engines():
+        engine = get_engine(name)
+        started = time.perf_counter()
+        output = engine.highResUpscale(image)
+        elapsed = time.perf_counter() - started
+        results[name] = elapsed if output.tobytes() == expected else None
+    return results
+
+def auto_select_engine(size=16):
+    """
+    Benchmark the available engines and make the fastest one the default.
+
+    SMOOTHER_ENGINE, when set, always wins over the benchmark result.
+
+    Returns:
+        str: Name of the engine now used by default
+    """
+    if os.environ.get('SMOOTHER_ENGINE'):
+        return default_engine_name()
+    results = benchmark_engines(size=size)
+    timings = {name: seconds for name, seconds in results.items() if seconds is not None}
+    _selected['name'] = min(timings, key=timings.get) if timings else DEFAULT_ENGINE
+    summary = ', '.join(f"{name} {'mismatch' if s is None else f'{s * 1000:.1f} ms'}" for name, s in results.items())
+    print(f"Engine benchmark: {summary}; using {_selected['name']}")
+    return _selected['name']
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+def get_worker_pool():
+    """Return the process-wide worker pool, starting it on first use"""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = ProcessPoolExecutor(max_workers=WORKER_PROCESSES,
+                                               mp_context=multiprocessing.get_context(POOL_START_METHOD))
+            atexit.register(_worker_pool.shutdown, wait=False, cancel_futures=True)
+        return _worker_pool
+
+def discard_worker_pool(pool):
+    """Forget a broken worker pool so the next get_worker_pool starts a new one"""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is pool:
+            _worker_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def map_in_pool(function, jobs, workers=None, label='Worker pool'):
+    """
+    Run function(*job) for every job in the shared worker pool.
+
+    Args:
+        function (callable): Module-level function, so it can be pickled
+        jobs (list): Argument tuples
+        workers (int): Most jobs of this call in flight at once (optional,
+            defaults to the pool size)
+        label (str): Caller name for the inline fallback message
+
+    Returns:
+        list: Results in job order; jobs not yet done when processes turn
+            out to be unavailable (or the pool breaks) are computed inline
+
+    Raises:
+        Exception: Whatever a job raises, as it would inline
+    """
+    jobs = list(jobs)
+    workers = max(1, workers or WORKER_PROCESSES)
+    try:
+        pool = get_worker_pool()
+    except POOL_ERRORS as e:
+        print(f"{label} falling back to inline execution: {e}")
+        return [function(*job) for job in jobs]
+
+    results = []
+    pending = deque()
+    try:
+        for job in jobs:
+            try:
+                pending.append(pool.submit(function, *job))
+            except POOL_ERRORS as e:
+                if isinstance(e, BrokenProcessPool):
+                    discard_worker_pool(pool)
+                print(f"{label} falling back to inline execution: {e}")
+                break
+            if len(pending) >= workers:
+                results.append(pending.popleft().result())
+        while pending:
+            results.append(pending.popleft().result())
+    except BrokenProcessPool as e:
+        # A worker died; errors raised by the jobs themselves propagate
+        discard_worker_pool(pool)
+        print(f"{label} falling back to inline execution: {e}")
+    return results + [function(*job) for job in jobs[len(results):]]
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Pixel-exactness regression corpus for the smoothing pipeline
+The golden/ directory holds a fixed set of small input images and the output
+of every Project5 stage for each of them. Any engine that claims to implement
+the pipeline can be checked against it bit for bit, stage by stage.
+
+Reference behaviour that an engine has to reproduce, quirks included:
+- upscale writes to x*2-1 / y*2-1 at x=0 / y=0, which wraps around to the
+  last column / row, so those come from the first input column / row
+- smooth, leftoverPixels and leftoverPixels2 skip the outer ring of pixels
+- putAverageColor averages only its first two neighbours (the third is read
+  but unused), and rounds half to even like Python's round()
+- brighten relies on Pillow clamping channel values above 255
+
+Usage:
+    python golden.py check [--engine reference|buffer|numpy|tiled|<module>]
+    python golden.py generate [--force]
+"""
+
+import os
+import sys
+import json
+import random
+import hashlib
+import argparse
+import importlib
+
+from PIL import Image
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+# Each stage is run on the reference output of the stages before it, so a
+# mismatch points at the stage that introduced it rather than everything after
+STAGES = [
+    ('upscale', lambda engine, image, ref: engine.upscale(image)),
+    ('smooth_10', lambda engine, image, ref: engine.smooth(image, 10)),
+    ('leftoverPixels_10', lambda engine, image, ref: engine.leftoverPixels(ref['smooth_10'])),
+    ('leftoverPixels2_20', lambda engine, image, ref: engine.leftoverPixels2(ref['upscale'], 20)),
+    ('lowResUpscale', lambda engine, image, ref: engine.overlay(ref['leftoverPixels_10'], ref['leftoverPixels2_20'])),
+    ('smooth_40', lambda engine, image, ref: engine.smooth(ref['lowResUpscale'], 40)),
+    ('leftoverPixels_40', lambda engine, image, ref: engine.leftoverPixels(ref['smooth_40'])),
+    ('upscale_2', lambda engine, image, ref: engine.upscale(ref['lowResUpscale'])),
+    ('leftoverPixels2_100', lambda engine, image, ref: engine.leftoverPixels2(ref['upscale_2'], 100)),
+    ('extraSmoothing', lambda engine, image, ref: engine.overlay(ref['leftoverPixels_40'], ref['leftoverPixels2_100'])),
+    ('brighten', lambda engine, image, ref: engine.brighten(ref['extraSmoothing'])),
+    ('highResUpscale', lambda engine, image, ref: engine.highResUpscale(image)),
+]
+
+def _random_image(rng, width, height, palette=None):
+    image = Image.new('RGB', (width, height))
+    if palette is None:
+        pixels = [(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(width * height)]
+    else:
+        pixels = [rng.choice(palette) for _ in range(width * height)]
+    image.putdata(pixels)
+    return image
+
+def _threshold_palette():
+    """Colours whose channel differences sit just around the 10/20/40/100 thresholds"""
+    base = 120
+    palette = [(base, base, base)]
+    for threshold in (10, 20, 40, 100):
+        for delta in (threshold - 1, threshold, threshold + 1):
+            palette.append((base + delta, base, base - delta))
+            palette.append((base, base + delta, base))
+    return palette
+
+def _sprite(width, height):
+    """A filled ellipse with an outline on a flat background"""
+    image = Image.new('RGB', (width, height), (40, 120, 200))
+    cx, cy = (width - 1) / 2, (height - 1) / 2
+    for x in range(width):
+        for y in range(height):
+            d = ((x - cx) / (width / 2.5)) ** 2 + ((y - cy) / (height / 2.5)) ** 2
+            if d < 0.6:
+                image.putpixel((x, y), (230, 200, 60))
+            elif d < 1.0:
+                image.putpixel((x, y), (20, 20, 20))
+    return image
+
+def corpus_inputs():
+    """
+    Build the deterministic set of corpus input images.
+
+    Returns:
+        list: (case name, PIL image) pairs
+    """
+    rng = random.Random(5)
+    checker = Image.new('RGB', (8, 8))
+    checker.putdata([(255, 255, 255) if (x + y) % 2 else (0, 0, 0) for y in range(8) for x in range(8)])
+    gradient = Image.new('RGB', (9, 4))
+    gradient.putdata([(x * 28, y * 60, 255 - x * 28) for y in range(4) for x in range(9)])
+    return [
+        ('single_pixel', Image.new('RGB', (1, 1), (200, 100, 50))),
+        ('two_by_two', _random_image(rng, 2, 2)),
+        ('three_by_three', _random_image(rng, 3, 3, [(0, 0, 0), (255, 255, 255)])),
+        ('flat', Image.new('RGB', (5, 4), (251, 3, 128))),
+        ('checkerboard', checker),
+        ('gradient', gradient),
+        ('palette', _random_image(rng, 12, 9, [(0, 0, 0), (255, 0, 77), (41, 173, 255), (255, 236, 39)])),
+        ('thresholds', _random_image(rng, 10, 7, _threshold_palette())),
+        ('noise', _random_image(rng, 16, 16)),
+        ('sprite', _sprite(11, 14)),
+        ('tall', _random_image(rng, 3, 12, [(10, 10, 10), (30, 30, 30), (90, 60, 30)])),
+    ]
+
+def pixel_digest(image):
+    """Hash of an image's mode, size and raw pixel bytes"""
+    digest = hashlib.sha256(f'{image.mode}:{image.width}x{image.height}:'.encode('utf-8'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def run_stages(engine, image, ref=None):
+    """
+    Run every stage of an engine on one input.
+
+    Args:
+        engine: Module or object providing the Project5 stage functions
+        image (PIL.Image.Image): Corpus input
+        ref (dict): Reference stage outputs to feed into later stages; when
+            None each stage consumes the engine's own earlier output
+
+    Returns:
+        dict: Stage name -> output image
+    """
+    outputs = {}
+    for name, stage in STAGES:
+        outputs[name] = stage(engine, image.copy(), outputs if ref is None else ref)
+    return outputs
+
+def generate(force=False):
+    """Write corpus inputs and Project5 reference outputs to golden/"""
+    import Project5
+
+    manifest_path = os.path.join(GOLDEN_DIR, 'manifest.json')
+    if os.path.exists(manifest_path) and not force:
+        raise SystemExit("Golden corpus already exists; pass --force to regenerate it")
+
+    manifest = {'stages': [name for name, _ in STAGES], 'cases': {}}
+    for case, image in corpus_inputs():
+        case_dir = os.path.join(GOLDEN_DIR, case)
+        os.makedirs(case_dir, exist_ok=True)
+        image.save(os.path.join(case_dir, 'input.png'))
+        outputs = run_stages(Project5, image)
+        for name, output in outputs.items():
+            output.save(os.path.join(case_dir, f'{name}.png'))
+        manifest['cases'][case] = {
+            'size': [image.width, image.height],
+            'input': pixel_digest(image),
+            'stages': {name: pixel_digest(output) for name, output in outputs.items()},
+        }
+        print(f"Generated {case}: {image.width}x{image.height}")
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+
+def load_case(case):
+    """Load a corpus input and its reference stage outputs"""
+    case_dir = os.path.join(GOLDEN_DIR, case)
+    image = Image.open(os.path.join(case_dir, 'input.png')).convert('RGB')
+    ref = {name: Image.open(os.path.join(case_dir, f'{name}.png')).convert('RGB') for name, _ in STAGES}
+    return image, ref
+
+def diff_images(expected, actual):
+    """
+    Compare two images pixel by pixel.
+
+    Returns:
+        dict: Empty if identical, otherwise a description of the differences
+    """
+    if actual.mode != 'RGB':
+        return {'error': f'mode {actual.mode}, expected RGB'}
+    if actual.size != expected.size:
+        return {'error': f'size {actual.width}x{actual.height}, expected {expected.width}x{expected.height}'}
+    if actual.tobytes() == expected.tobytes():
+        return {}
+
+    width = expected.width
+    differing = 0
+    max_delta = 0
+    first = None
+    for index, (e, a) in enumerate(zip(expected.getdata(), actual.getdata())):
+        if e != a:
+            differing += 1
+            max_delta = max(max_delta, *(abs(ec - ac) for ec, ac in zip(e, a)))
+            if first is None:
+                first = {'x': index % width, 'y': index // width, 'expected': list(e), 'actual': list(a)}
+    return {'pixels': differing, 'maxDelta': max_delta, 'first': first}
+
+def check_engine(engine, cases=None):
+    """
+    Check an engine against the golden corpus.
+
+    Every stage is fed the reference output of the previous stages, so the
+    report shows exactly which stage diverges and where.
+
+    Args:
+        engine: Module or object providing the Project5 stage functions
+        cases (list): Case names to check (optional, defaults to all)
+
+    Returns:
+        dict: Case name -> {stage name -> diff} for every stage that differs
+    """
+    with open(os.path.join(GOLDEN_DIR, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    failures = {}
+    for case in cases or sorted(manifest['cases']):
+        image, ref = load_case(case)
+        case_failures = {}
+        for name, stage in STAGES:
+            actual = stage(engine, image.copy(), ref)
+            diff = diff_images(ref[name], actual)
+            if diff:
+                case_failures[name] = diff
+        if case_failures:
+            failures[case] = case_failures
+    return failures
+
+def load_engine(name):
+    """Get a registered engine by name, or import a module providing the pipeline"""
+    import engines
+    if name in engines.ENGINE_CLASSES:
+        return engines.get_engine(name)
+    return importlib.import_module(name)
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-output checks for the smoothing pipeline")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    check = subcommands.add_parser('check', help="Compare an engine with the reference outputs")
+    check.add_argument('--engine', default='Project5', help="Engine name or module to check")
+    check.add_argument('cases', nargs='*', help="Corpus cases to check (default: all)")
+    gen = subcommands.add_parser('generate', help="Regenerate reference outputs from Project5")
+    gen.add_argument('--force', action='store_true', help="Overwrite an existing corpus")
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate(args.force)
+        return 0
+
+    failures = check_engine(load_engine(args.engine), args.cases)
+    if not failures:
+        print(f"{args.engine}: all stages match the golden corpus")
+        return 0
+    for case, stages in failures.items():
+        for stage, diff in stages.items():
+            print(f"{case} / {stage}: {json.dumps(diff)}")
+    print(f"{args.engine}: {sum(len(s) for s in failures.values())} stage mismatches in {len(failures)} cases")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
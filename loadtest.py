@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Load-testing harness for the request handlers
+Replays a request mix against the Vercel-style handlers (web_backend's
+handle_request and the process-image / create-gif functions) either
+in-process or over HTTP against a running server, with a configurable number
+of concurrent clients. Reports throughput, latency percentiles per request
+kind, status counts, the memory high-water mark (for in-process runs, where
+the handlers share this process) and cold-start overhead measured in fresh
+interpreters.
+
+The mix is synthetic (image uploads of several sizes, character GIFs, static
+GETs) or replayed from a JSON file of recorded events (--replay); --record
+saves the synthetic mix so a run can be repeated exactly.
+
+Over HTTP, events use the /api/... paths that web_backend (port 8000) and
+the Vercel deployment route; --paths local strips the /api prefix for
+local_server (port 8080), which serves /process-image, /create-gif and
+/cancel.
+
+Usage:
+    python loadtest.py --requests 200 --concurrency 8
+    python loadtest.py --target functions --replay events.json
+    python loadtest.py --url http://localhost:8000 --concurrency 16
+    python loadtest.py --url http://localhost:8080 --paths local
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import importlib
+import importlib.util
+import subprocess
+import statistics
+import urllib.error
+import urllib.request
+from io import BytesIO
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is reported as None
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Request kind -> relative weight in the synthetic mix
+DEFAULT_MIX = {
+    'image-8': 4,
+    'image-16': 4,
+    'image-32': 2,
+    'gif': 1,
+    'static': 6,
+    'stats': 1,
+}
+
+STATIC_PATHS = ('/', '/index.html', '/styles.css', '/script.js')
+
+def _image_data_url(size, seed):
+    from PIL import Image
+    rng = random.Random(seed)
+    palette = [(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(6)]
+    image = Image.new('RGB', (size, size))
+    image.putdata([rng.choice(palette) for _ in range(size * size)])
+    output = BytesIO()
+    image.save(output, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(output.getvalue()).decode('utf-8')
+
+def _post(path, payload, kind):
+    return {
+        'kind': kind,
+        'httpMethod': 'POST',
+        'path': path,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(payload),
+    }
+
+def _get(path, kind):
+    return {'kind': kind, 'httpMethod': 'GET', 'path': path, 'headers': {}, 'body': ''}
+
+def synthetic_events(count, mix=None, image_pool=8, seed=1):
+    """
+    Build a random request mix.
+
+    Args:
+        count (int): Number of events
+        mix (dict): Request kind -> weight (optional, defaults to DEFAULT_MIX)
+        image_pool (int): Distinct images per size; repeats hit the result
+            cache, 0 makes every upload unique
+        seed (int): Random seed, so runs are reproducible
+
+    Returns:
+        list: Vercel-style event dicts, each with a 'kind' label
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    events = []
+    for index in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        if kind.startswith('image-'):
+            size = int(kind.split('-')[1])
+            image_seed = rng.randrange(image_pool) if image_pool else seed * 7919 + index
+            events.append(_post('/api/process-image', {'image': _image_data_url(size, size * 1000003 + image_seed)}, kind))
+        elif kind == 'gif':
+            events.append(_post('/api/create-gif', {'character': rng.choice(['samus', 'fei', 'bart'])}, kind))
+        elif kind == 'static':
+            events.append(_get(rng.choice(STATIC_PATHS), kind))
+        elif kind == 'stats':
+            events.append(_get('/api/stats', kind))
+        else:
+            raise ValueError(f"Unknown request kind: {kind}")
+    return events
+
+def _load_module(filename, name):
+    """Import a handler file, including the hyphenated function files"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class InProcessTarget:
+    """
+    Calls the handlers directly.
+
+    mode 'web_backend' sends everything through web_backend.handle_request;
+    'functions' routes like vercel.json, to the process-image and create-gif
+    functions, with static GETs going to web_backend.
+    """
+
+    # The handlers run here, so this process's RSS is theirs
+    in_process = True
+
+    def __init__(self, mode='web_backend'):
+        self.mode = mode
+        if HERE not in sys.path:
+            sys.path.insert(0, HERE)
+        self.web_backend = importlib.import_module('web_backend')
+        if mode == 'functions':
+            self.process_image = _load_module('process-image.py', 'process_image_function')
+            self.create_gif = _load_module('create-gif.py', 'create_gif_function')
+
+    def handler_for(self, path):
+        if self.mode != 'functions':
+            return self.web_backend.handle_request
+        if path == '/api/create-gif' or path.startswith('/results/character/'):
+            return self.create_gif.handler
+        if path.startswith(('/api/process-image', '/api/progress/', '/api/cancel', '/results/')):
+            return self.process_image.handler
+        return self.web_backend.handle_request
+
+    def send(self, event):
+        event = {key: value for key, value in event.items() if key != 'kind'}
+        response = self.handler_for(event['path'])(event, None)
+        return response['statusCode'], response.get('headers', {})
+
+class HttpTarget:
+    """
+    Sends each event as a real HTTP request to a running server.
+
+    paths 'api' keeps the events' /api/... paths (web_backend, Vercel);
+    'local' drops the /api prefix, for local_server.
+    """
+
+    # The server's memory isn't visible from here
+    in_process = False
+
+    def __init__(self, base_url, timeout=120, paths='api'):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.paths = paths
+
+    def url_for(self, path):
+        if self.paths == 'local' and path.startswith('/api/'):
+            path = path[len('/api'):]
+        return self.base_url + path
+
+    def send(self, event):
+        body = event.get('body') or None
+        request = urllib.request.Request(self.url_for(event['path']), method=event['httpMethod'],
+                                         data=body.encode('utf-8') if body else None,
+                                         headers=event.get('headers') or {})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status, dict(response.headers)
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, dict(e.headers)
+
+def percentiles(values, points=(50, 90, 95, 99)):
+    """Nearest-rank percentiles of a list of numbers"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {f'p{point}': round(ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))], 2)
+              for point in points}
+    result['max'] = round(ordered[-1], 2)
+    return result
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_load(target, events, concurrency=8):
+    """
+    Replay events against a target with a pool of concurrent clients.
+
+    Returns:
+        dict: Throughput, latency percentiles (overall and per kind), status
+            counts and, for in-process targets, the process's peak RSS
+    """
+    latencies = defaultdict(list)
+    statuses = Counter()
+    first_call = {}
+
+    def send(event):
+        started = time.perf_counter()
+        try:
+            status, headers = target.send(event)
+        except Exception as e:
+            status, headers = f'error: {type(e).__name__}', {}
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return event.get('kind', event['path']), status, elapsed_ms, headers
+
+    in_process = getattr(target, 'in_process', False)
+    rss_before = _peak_rss_mb() if in_process else None
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for kind, status, elapsed_ms, headers in pool.map(send, events):
+            latencies[kind].append(elapsed_ms)
+            statuses[str(status)] += 1
+            if 'X-Cold-Start-Ms' in headers:
+                first_call[kind] = float(headers['X-Cold-Start-Ms'])
+    wall = time.perf_counter() - started
+
+    everything = [value for values in latencies.values() for value in values]
+    report = {
+        'requests': len(events),
+        'concurrency': concurrency,
+        'seconds': round(wall, 3),
+        'throughput': round(len(events) / wall, 2) if wall else None,
+        'latencyMs': percentiles(everything),
+        'byKind': {kind: {'count': len(values), **percentiles(values)} for kind, values in sorted(latencies.items())},
+        'statuses': dict(statuses),
+    }
+    if in_process:
+        report['peakRssMb'] = {'before': rss_before, 'after': _peak_rss_mb()}
+    if first_call:
+        # Reported by handlers on their first invocation (warm_cache)
+        report['handlerColdStartMs'] = first_call
+    return report
+
+_COLD_START_SCRIPT = '''
+import sys, time, json
+started = time.perf_counter()
+sys.path.insert(0, {here!r})
+import loadtest
+target = loadtest.InProcessTarget({mode!r})
+imported = time.perf_counter()
+event = loadtest.synthetic_events(1, {{'image-8': 1}})[0]
+first_started = time.perf_counter()
+target.send(event)
+first = time.perf_counter()
+target.send(event)
+second = time.perf_counter()
+print(json.dumps({{
+    'importMs': (imported - started) * 1000,
+    'firstRequestMs': (first - first_started) * 1000,
+    'warmRequestMs': (second - first) * 1000,
+}}))
+'''
+
+def measure_cold_start(mode='web_backend', runs=3):
+    """
+    Time handler import and first request in fresh interpreters.
+
+    Every run starts a new Python process, imports the handlers and sends the
+    same small upload twice; the second (result-cache) request shows what is
+    left once the instance is warm.
+
+    Returns:
+        dict: Median import, first-request and warm-request times in ms
+    """
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', _COLD_START_SCRIPT.format(here=HERE, mode=mode)],
+                                capture_output=True, text=True, check=True, cwd=HERE).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    report = {name: round(statistics.median(sample[name] for sample in samples), 1) for name in samples[0]}
+    report['overheadMs'] = round(report['importMs'] + report['firstRequestMs'] - report['warmRequestMs'], 1)
+    report['runs'] = runs
+    return report
+
+def _print_report(report):
+    print(f"{report['requests']} requests, concurrency {report['concurrency']}: "
+          f"{report['throughput']} req/s over {report['seconds']} s")
+    print(f"latency ms: {report['latencyMs']}")
+    for kind, stats in report['byKind'].items():
+        print(f"  {kind:10} {stats}")
+    print(f"statuses: {report['statuses']}")
+    print(f"peak RSS MB: {report.get('peakRssMb', 'n/a (server runs out of process)')}")
+    if 'handlerColdStartMs' in report:
+        print(f"handler cold start ms: {report['handlerColdStartMs']}")
+    if 'coldStart' in report:
+        print(f"cold start ms: {report['coldStart']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the request handlers")
+    parser.add_argument('--target', choices=['web_backend', 'functions'], default='web_backend',
+                        help="In-process handlers to call (ignored with --url)")
+    parser.add_argument('--url', help="Base URL of a running server to load over HTTP instead")
+    parser.add_argument('--paths', choices=['api', 'local'], default='api',
+                        help="Path style of the --url server: api (web_backend, Vercel) or local (local_server)")
+    parser.add_argument('--requests', type=int, default=100, help="Number of synthetic requests")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients")
+    parser.add_argument('--image-pool', type=int, default=8, help="Distinct images per size (0: all unique)")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for the synthetic mix")
+    parser.add_argument('--replay', help="JSON file of recorded events to replay instead of a synthetic mix")
+    parser.add_argument('--record', help="Save the events used to this JSON file")
+    parser.add_argument('--cold-starts', type=int, default=3, help="Fresh-interpreter cold start runs (0 to skip)")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.replay:
+        with open(args.replay) as f:
+            events = json.load(f)
+    else:
+        events = synthetic_events(args.requests, image_pool=args.image_pool, seed=args.seed)
+    if args.record:
+        with open(args.record, 'w') as f:
+            json.dump(events, f)
+
+    target = HttpTarget(args.url, paths=args.paths) if args.url else InProcessTarget(args.target)
+    report = run_load(target, events, args.concurrency)
+    if args.cold_starts and not args.url:
+        report['coldStart'] = measure_cold_start(args.target, args.cold_starts)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
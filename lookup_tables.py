@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Precomputed lookup tables for the smoothing thresholds
+corners() and putAverageColor() compare channel means and differences against
+fixed thresholds (10 and 40 for smooth, 20 and 100 for leftoverPixels2) and
+compute rounded pair averages. Every input is a small integer, so the results
+are tabulated once and the hot loops index a bytes object instead of doing
+float arithmetic and branching. Tables live in the warm cache, so serverless
+instances build them once and warm_cache.warm_up() can build them ahead of
+the first request.
+"""
+
+import warm_cache
+
+# Thresholds used by lowResUpscale / extraSmoothing
+SMOOTH_SCALES = (10, 40)
+AVERAGE_SCALES = (20, 100)
+
+# Offsets that make the smallest table index 0
+CORNER_OFFSET = 510
+DIFF_OFFSET = 255
+
+def _build_corner_mask(scale):
+    # |(c1 + c2 + c3) / 3 - c2| < scale  <=>  |c1 + c3 - 2 * c2| < 3 * scale,
+    # exactly, because both sides are integers once multiplied by 3
+    return bytes(1 if abs(value) < 3 * scale else 0 for value in range(-CORNER_OFFSET, CORNER_OFFSET + 1))
+
+def _build_diff_mask(scale2):
+    return bytes(1 if abs(value) < scale2 else 0 for value in range(-DIFF_OFFSET, DIFF_OFFSET + 1))
+
+def _build_pair_average():
+    # Python's round() rounds halves to even; keep that exactly
+    return bytes(round(total / 2) for total in range(511))
+
+def corner_mask(scale):
+    """
+    Table for corners(): index c1 + c3 - 2 * c2 + CORNER_OFFSET per channel.
+
+    An entry is 1 when the three-pixel mean is within scale of the middle
+    pixel, i.e. when abs((c1 + c2 + c3) / 3 - c2) < scale.
+
+    Args:
+        scale (int): smooth threshold
+
+    Returns:
+        bytes: 1021-entry mask
+    """
+    return warm_cache.get_table(f'corner_mask_{scale}', lambda: _build_corner_mask(scale))
+
+def diff_mask(scale2):
+    """
+    Table for putAverageColor(): index c1 - c2 + DIFF_OFFSET per channel.
+
+    An entry is 1 when abs(c1 - c2) < scale2.
+
+    Args:
+        scale2 (int): leftoverPixels2 threshold
+
+    Returns:
+        bytes: 511-entry mask
+    """
+    return warm_cache.get_table(f'diff_mask_{scale2}', lambda: _build_diff_mask(scale2))
+
+def pair_average():
+    """Table of round((a + b) / 2), indexed by a + b"""
+    return warm_cache.get_table('pair_average', _build_pair_average)
+
+# Register the fixed thresholds so warm-up builds them before any request
+for _scale in SMOOTH_SCALES:
+    warm_cache.register_table(f'corner_mask_{_scale}', lambda scale=_scale: _build_corner_mask(scale))
+for _scale in AVERAGE_SCALES:
+    warm_cache.register_table(f'diff_mask_{_scale}', lambda scale=_scale: _build_diff_mask(scale))
+warm_cache.register_table('pair_average', _build_pair_average)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Vectorized smoothing engine
+Implements every Project5 stage as whole-array numpy operations. Each stage
+reads only from its input and writes disjoint pixels (or, in leftoverPixels2,
+lets later neighbour pairs overwrite earlier ones), so the per-pixel loops
+become masked selects with identical results, quirks included.
+Requires numpy, which is an optional dependency.
+"""
+
+import numpy as np
+from PIL import Image
+
+from engines import Engine, DEFAULT_THRESHOLDS
+from progress import staged
+
+def to_array(image):
+    """PIL RGB image -> (height, width, 3) int16 array"""
+    return np.asarray(image.convert('RGB'), dtype=np.int16)
+
+def to_image(array):
+    """(height, width, 3) array -> PIL RGB image"""
+    return Image.fromarray(array.astype(np.uint8), 'RGB')
+
+def round_half_even_mean(a, b):
+    """round((a + b) / 2) with Python's round-half-to-even"""
+    total = a + b
+    half = total >> 1
+    return half + (total & half & 1)
+
+def upscale_array(a):
+    # Output index i comes from input (i + 1) // 2, where the last index wraps
+    # to 0 because upscale writes to x*2-1 / y*2-1 at x=0 / y=0
+    height, width = a.shape[:2]
+    rows = ((np.arange(height * 2) + 1) // 2) % height
+    cols = ((np.arange(width * 2) + 1) // 2) % width
+    return a[rows][:, cols]
+
+def smooth_array(a, scale):
+    height, width = a.shape[:2]
+    source = upscale_array(a)
+    out = source.copy()
+    if width < 3 or height < 3:
+        return out
+
+    # |(c1 + c2 + c3) / 3 - c2| < scale  <=>  |c1 + c3 - 2 * c2| < 3 * scale
+    # for integers, so corners() needs no floating point
+    limit = 3 * scale
+    n_x, n_y = width - 2, height - 2
+
+    def rows(offset):
+        start = 2 + offset
+        return slice(start, start + 2 * n_y, 2)
+
+    def cols(offset):
+        start = 2 + offset
+        return slice(start, start + 2 * n_x, 2)
+
+    def corner(origin, p1, p2, p3):
+        c1 = source[rows(p1[1]), cols(p1[0])]
+        c2 = source[rows(p2[1]), cols(p2[0])]
+        c3 = source[rows(p3[1]), cols(p3[0])]
+        ok = (np.abs(c1 + c3 - 2 * c2) < limit).all(axis=2)
+        target = out[rows(origin[1]), cols(origin[0])]
+        target[ok] = c2[ok]
+
+    # (dx, dy) offsets from (x*2, y*2), in the order smooth() calls corners()
+    corner((0, 0), (0, 1), (1, 1), (1, 0))
+    corner((-1, -1), (-1, -2), (-2, -2), (-2, -1))
+    corner((-1, 0), (-1, 1), (-2, 1), (-2, 0))
+    corner((0, -1), (1, -1), (1, -2), (0, -2))
+    return out
+
+def _interior(a, dx, dy):
+    height, width = a.shape[:2]
+    return a[1 + dy:height - 1 + dy, 1 + dx:width - 1 + dx]
+
+def leftover_pixels_array(a):
+    out = a.copy()
+    height, width = a.shape[:2]
+    if width < 3 or height < 3:
+        return out
+
+    def same(p, q):
+        return (p == q).all(axis=2)
+
+    right, left = _interior(a, 1, 0), _interior(a, -1, 0)
+    down, up = _interior(a, 0, 1), _interior(a, 0, -1)
+
+    # Chained a == b != c, evaluated like the if/elif chain: first match wins
+    conditions = [
+        same(right, down) & ~same(down, _interior(a, 1, 1)),
+        same(left, up) & ~same(up, _interior(a, -1, -1)),
+        same(left, down) & ~same(down, _interior(a, -1, 1)),
+        same(right, up) & ~same(up, _interior(a, 1, -1)),
+    ]
+    choices = [right, left, left, right]
+
+    target = _interior(out, 0, 0)
+    for condition, choice in reversed(list(zip(conditions, choices))):
+        target[condition] = choice[condition]
+    return out
+
+def leftover_pixels2_array(a, scale2):
+    out = a.copy()
+    height, width = a.shape[:2]
+    if width < 3 or height < 3:
+        return out
+
+    target = _interior(out, 0, 0)
+    # putAverageColor only uses its first two neighbours; later calls overwrite
+    for (x1, y1), (x2, y2) in (((1, 0), (0, 1)), ((-1, 0), (0, -1)),
+                               ((-1, 0), (0, 1)), ((1, 0), (0, -1))):
+        c1, c2 = _interior(a, x1, y1), _interior(a, x2, y2)
+        ok = (np.abs(c1 - c2) < scale2).all(axis=2)
+        target[ok] = round_half_even_mean(c1, c2)[ok]
+    return out
+
+def overlay_array(a, b):
+    return round_half_even_mean(a, b)
+
+def brighten_array(a):
+    # putpixel clamps to 255
+    return np.minimum(a + 4, 255)
+
+class NumpyEngine(Engine):
+    """Whole-array numpy implementation of the pipeline"""
+
+    name = 'numpy'
+
+    def highResUpscale(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        return to_image(self.high_res_array(to_array(image), progress, thresholds))
+
+    def lowResUpscale(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        return to_image(self.low_res_array(to_array(image), thresholds.scale, thresholds.scale2, progress))
+
+    def extraSmoothing(self, image, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        return to_image(self.extra_smoothing_array(to_array(image), thresholds.extra_scale, thresholds.extra_scale2, progress))
+
+    # Whole-array stages are quick, so progress is only checked between them
+
+    def high_res_array(self, a, progress=None, thresholds=DEFAULT_THRESHOLDS):
+        low = self.low_res_array(a, thresholds.scale, thresholds.scale2, progress)
+        return staged(progress, 'brighten', brighten_array,
+                      self.extra_smoothing_array(low, thresholds.extra_scale, thresholds.extra_scale2, progress))
+
+    def low_res_array(self, a, scale=10, scale2=20, progress=None):
+        smoothed = staged(progress, 'leftoverPixels', leftover_pixels_array, staged(progress, 'smooth', smooth_array, a, scale))
+        averaged = staged(progress, 'leftoverPixels2', leftover_pixels2_array, staged(progress, 'upscale', upscale_array, a), scale2)
+        return staged(progress, 'overlay', overlay_array, smoothed, averaged)
+
+    def extra_smoothing_array(self, a, scale=40, scale2=100, progress=None):
+        return self.low_res_array(a, scale, scale2, progress)
+
+    def upscale(self, image):
+        return to_image(upscale_array(to_array(image)))
+
+    def smooth(self, image, scale):
+        return to_image(smooth_array(to_array(image), scale))
+
+    def leftoverPixels(self, image):
+        return to_image(leftover_pixels_array(to_array(image)))
+
+    def leftoverPixels2(self, image, scale2):
+        return to_image(leftover_pixels2_array(to_array(image), scale2))
+
+    def overlay(self, image1, image2):
+        return to_image(overlay_array(to_array(image1), to_array(image2)))
+
+    def brighten(self, image):
+        return to_image(brighten_array(to_array(image)))
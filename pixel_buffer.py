@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compact pixel representation for the smoothing pipeline
+A PixelBuffer is a width*height*3 bytearray of packed RGB rows. Stages read
+and write channel bytes by offset instead of going through PIL's getpixel /
+putpixel, which allocate a tuple per access, and PIL is only involved when an
+image is decoded or encoded.
+"""
+
+from PIL import Image
+
+class PixelBuffer:
+    """Packed RGB pixels: row-major, three bytes per pixel"""
+
+    __slots__ = ('width', 'height', 'data')
+
+    def __init__(self, width, height, data=None):
+        self.width = width
+        self.height = height
+        if data is None:
+            data = bytearray(width * height * 3)
+        elif len(data) != width * height * 3:
+            raise ValueError(f"Buffer holds {len(data)} bytes, expected {width * height * 3} for {width}x{height}")
+        self.data = data
+
+    @classmethod
+    def from_image(cls, image, out=None):
+        """
+        Copy a PIL image's pixels into a buffer.
+
+        Args:
+            image (PIL.Image.Image): Source image
+            out (PixelBuffer): Buffer of the same size to fill (optional)
+
+        Returns:
+            PixelBuffer: The filled buffer
+        """
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if out is None:
+            return cls(image.width, image.height, bytearray(image.tobytes()))
+        out = check_output(out, image.width, image.height)
+        out.data[:] = image.tobytes()
+        return out
+
+    def to_image(self):
+        """Copy the pixels into a new PIL RGB image"""
+        return Image.frombytes('RGB', (self.width, self.height), bytes(self.data))
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    @property
+    def stride(self):
+        """Bytes per row"""
+        return self.width * 3
+
+    def offset(self, x, y):
+        """Index of the red byte of pixel (x, y)"""
+        return (y * self.width + x) * 3
+
+    def getpixel(self, xy):
+        """Read one pixel as an (r, g, b) tuple (for debugging, not hot loops)"""
+        i = self.offset(*xy)
+        return tuple(self.data[i:i + 3])
+
+    def copy(self, out=None):
+        """
+        Copy the pixels, into out if given.
+
+        Args:
+            out (PixelBuffer): Buffer of the same size to overwrite (optional)
+
+        Returns:
+            PixelBuffer: The copy
+        """
+        if out is None:
+            return PixelBuffer(self.width, self.height, bytearray(self.data))
+        out.data[:] = self.data
+        return out
+
+def check_output(out, width, height):
+    """Return out if it fits width x height, a new buffer if out is None"""
+    if out is None:
+        return PixelBuffer(width, height)
+    if out.size != (width, height):
+        raise ValueError(f"Output buffer is {out.width}x{out.height}, expected {width}x{height}")
+    return out
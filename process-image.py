@@ -5,19 +5,20 @@ Vercel serverless function for processing images
 
 import os
 import json
-import base64
-from io import BytesIO
 import sys
 
 # Add the current directory to the path so we can import Project5
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    from Project5 import highResUpscale
-    from PIL import Image
-except ImportError as e:
-    print(f"Error importing smoothing functions: {e}")
-    sys.exit(1)
+# Project5 and Pillow are imported lazily on the first request so that
+# instance start-up stays cheap
+import warm_cache
+import smoother_service
+import engines
+import result_cache
+
+# Module loading is the first part of a cold start
+warm_cache.mark_loaded()
 
 def handler(event, context):
     """Main handler for Vercel serverless function"""
@@ -32,6 +33,21 @@ def handler(event, context):
         'Access-Control-Allow-Headers': 'Content-Type'
     }
     
+    # Warm-up ping: load everything now so the next real request is fast
+    if warm_cache.is_warmup_event(event):
+        report = warm_cache.warm_up()
+        report['engine'] = engines.auto_select_engine()
+        return {
+            'statusCode': 200,
+            'headers': {**cors_headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({**report, **warm_cache.report()})
+        }
+    
+    # Any other request means the instance is up; processing requests stop
+    # the cold-start clock once the pipeline has loaded
+    if method != 'POST' or event.get('path', '').endswith('/cancel'):
+        warm_cache.mark_ready()
+    
     # Handle preflight requests
     if method == 'OPTIONS':
         return {
@@ -40,8 +56,32 @@ def handler(event, context):
             'body': ''
         }
     
+    # Results cached by this instance can be fetched again by URL
+    if method == 'GET' and result_cache.parse_result_path(event.get('path', '')):
+        return smoother_service.to_vercel_response(
+            result_cache.serve_result(event.get('path', ''), headers), cors_headers)
+    
+    # Progress of jobs running on this instance, for polling clients
+    job_id = smoother_service.progress_job_id(event.get('path', ''))
+    if method == 'GET' and job_id:
+        return smoother_service.to_vercel_response(smoother_service.job_progress(job_id), cors_headers)
+    
+    if method == 'POST' and event.get('path', '').endswith('/cancel'):
+        return smoother_service.to_vercel_response(smoother_service.cancel_job(body), cors_headers)
+    
     if method == 'POST':
-        return handle_process_image(body, cors_headers)
+        try:
+            cold_start_ms = warm_cache.record_invocation()
+        except ImportError as e:
+            print(f"Error importing smoothing functions: {e}")
+            return {
+                'statusCode': 500,
+                'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                'body': json.dumps({'success': False, 'error': str(e)})
+            }
+        response = handle_process_image(body, cors_headers)
+        response['headers'].update(warm_cache.cold_start_headers(cold_start_ms))
+        return response
     else:
         return {
             'statusCode': 405,
@@ -51,62 +91,4 @@ def handler(event, context):
 
 def handle_process_image(body, cors_headers):
     """Handle image processing requests"""
-    try:
-        # Parse JSON data
-        data = json.loads(body)
-        image_data = data.get('image')
-        
-        if not image_data:
-            raise ValueError("No image data provided")
-        
-        # Decode base64 image
-        if image_data.startswith('data:image/'):
-            image_data = image_data.split(',')[1]
-        
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(BytesIO(image_bytes))
-        
-        # Convert image to RGB format if needed
-        if image.mode != 'RGB':
-            print(f"Converting image from {image.mode} to RGB")
-            image = image.convert('RGB')
-        
-        print(f"Processing image: {image.width}x{image.height} pixels")
-        
-        # Always use high-res upscale
-        processed_image = highResUpscale(image)
-        
-        print(f"Processing complete: {processed_image.width}x{processed_image.height} pixels")
-        
-        # Convert back to base64
-        output_buffer = BytesIO()
-        processed_image.save(output_buffer, format='PNG')
-        output_data = base64.b64encode(output_buffer.getvalue()).decode('utf-8')
-        
-        # Send response
-        response = {
-            'success': True,
-            'processedImage': f'data:image/png;base64,{output_data}'
-        }
-        
-        return {
-            'statusCode': 200,
-            'headers': {**cors_headers, 'Content-Type': 'application/json'},
-            'body': json.dumps(response)
-        }
-        
-    except Exception as e:
-        print(f"Error processing image: {e}")
-        import traceback
-        traceback.print_exc()
-        response = {
-            'success': False,
-            'error': str(e)
-        }
-        
-        return {
-            'statusCode': 500,
-            'headers': {**cors_headers, 'Content-Type': 'application/json'},
-            'body': json.dumps(response)
-        }
-        
\ No newline at end of file
+    return smoother_service.to_vercel_response(smoother_service.process_image(body), cors_headers)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Progress reporting and cancellation for pipeline runs
+A Progress object is passed down through the pipeline stages. Per-pixel
+stages call update() every CHECK_EVERY_ROWS rows (columns, for Project5's
+x-outer loops) and end() when they finish; both raise Cancelled once the
+run's CancellationToken has been cancelled, so an abandoned request stops
+within a few rows. Progress snapshots are kept in a registry by job id so
+clients can poll them while the request runs.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from service_response import RequestError
+
+CHECK_EVERY_ROWS = int(os.environ.get('PROGRESS_CHECK_ROWS', 8))
+
+# Stage loops that report in one run: lowResUpscale and extraSmoothing are
+# smooth, leftoverPixels, upscale, leftoverPixels2 and overlay; highResUpscale
+# adds brighten
+LOW_RES_STAGES = 5
+HIGH_RES_STAGES = 2 * LOW_RES_STAGES + 1
+
+class Cancelled(RequestError):
+    """Raised inside the pipeline when its run has been cancelled"""
+
+    def __init__(self, message="Request cancelled"):
+        # 499: client closed request
+        super().__init__(499, message)
+
+class CancellationToken:
+    """Thread-safe flag that a run checks to see whether it should stop"""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.event.is_set():
+            raise Cancelled()
+
+class Progress:
+    """
+    Progress callback and cancellation token for one pipeline run.
+
+    Args:
+        callback (callable): Called with a snapshot dict on every update (optional)
+        token (CancellationToken): Token checked on every update (optional)
+        stages (int): Number of stage loops the run will report, for the overall fraction
+        every (int): Rows between checks
+    """
+
+    def __init__(self, callback=None, token=None, stages=HIGH_RES_STAGES, every=None):
+        self.callback = callback
+        self.token = token or CancellationToken()
+        self.stages = stages
+        self.every = every or CHECK_EVERY_ROWS
+        self.completed = 0
+        self.stage = None
+        self.fraction = 0.0
+        self.state = 'running'
+        self.started = time.time()
+        self.ended = None
+
+    def update(self, stage, done, total):
+        """Report done of total rows in a stage; raises Cancelled if cancelled"""
+        self.token.raise_if_cancelled()
+        self.stage = stage
+        self.fraction = min(1.0, (self.completed + done / max(total, 1)) / self.stages)
+        if self.callback is not None:
+            self.callback(self.snapshot())
+
+    def end(self, stage):
+        """Mark a stage loop finished"""
+        self.completed += 1
+        self.update(stage, 0, 1)
+
+    def finish(self, state='done'):
+        """Record how the run ended: done, cancelled or failed"""
+        self.state = state
+        self.ended = time.time()
+        if state == 'done':
+            self.fraction = 1.0
+
+    def snapshot(self):
+        return {
+            'state': self.state,
+            'stage': self.stage,
+            'fraction': round(self.fraction, 4),
+            # A finished run's elapsed time stops at finish()
+            'elapsedMs': round(((self.ended or time.time()) - self.started) * 1000, 1),
+        }
+
+def staged(progress, stage, function, *args):
+    """Run a whole stage, reporting it to progress (which may be None) before and after"""
+    if progress is None:
+        return function(*args)
+    progress.update(stage, 0, 1)
+    result = function(*args)
+    progress.end(stage)
+    return result
+
+class JobRegistry:
+    """Progress of recent runs by client-supplied job id, for polling"""
+
+    def __init__(self, max_jobs=256):
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def register(self, job_id, progress):
+        with self.lock:
+            self.jobs[job_id] = progress
+            self.jobs.move_to_end(job_id)
+            # Finished jobs are dropped oldest first; running ones stay
+            for old_id in list(self.jobs):
+                if len(self.jobs) <= self.max_jobs:
+                    break
+                if self.jobs[old_id].state != 'running':
+                    del self.jobs[old_id]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a running job; returns False if the id is unknown"""
+        progress = self.get(job_id)
+        if progress is None:
+            return False
+        progress.token.cancel()
+        return True
+
+_registry = JobRegistry()
+
+def get_job_registry():
+    """Return the process-wide job registry"""
+    return _registry
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Processed result cache for Pixel Art Smoother
+Results are keyed by a hash of the uploaded bytes, so a repeat upload skips
+the pipeline and the encoded output can be fetched again from a stable
+/results/<key>.<ext> URL with a content-hash ETag. When RESULT_STORE_DIR is
+set, results also go to the on-disk store (result_store), so they survive
+restarts and are shared between worker processes.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import result_store
+from service_response import ServiceResponse, etag_matches, get_header
+
+RESULT_PATH_PREFIXES = ('/results/', '/api/results/')
+
+# Character GIFs are cached by the create-gif function, which on Vercel is a
+# separate instance from process-image, so their URLs route there instead
+CHARACTER_RESULT_SECTION = 'character/'
+
+# Results are a pure function of their key, so URLs never change meaning
+RESULT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+RESULT_TYPES = {
+    'png': 'image/png',
+    'gif': 'image/gif',
+}
+
+# Store payloads up to this size are copied out and their mapping closed; a
+# mapping holds a file descriptor for as long as it lives, so only large
+# results stay mapped in the LRU, and at most MAX_MAPPED_ENTRIES of them
+MAPPED_MIN_BYTES = int(os.environ.get('RESULT_CACHE_MAPPED_MIN_BYTES', 1024 * 1024))
+MAX_MAPPED_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_MAPPED', 16))
+
+class CachedResult:
+    """Encoded output bytes (or a mapped view of them) with their content type and ETag"""
+
+    def __init__(self, key, data, content_type, etag=None, mapped=False):
+        self.key = key
+        self.data = data
+        self.content_type = content_type
+        self.etag = etag or f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+        self.mapped = mapped
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of encoded results, bounded by total bytes.
+
+    Misses fall through to the on-disk store when one is given. Small entries
+    found there are copied into memory; large ones are memory-mapped, not
+    read, and the LRU keeps at most max_mapped of those.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, store=None, max_mapped=MAX_MAPPED_ENTRIES):
+        self.max_bytes = max_bytes
+        self.store = store
+        self.max_mapped = max_mapped
+        self.entries = OrderedDict()
+        self.bytes_held = 0
+        self.mapped = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the CachedResult for a key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        if self.store is None:
+            return None
+        stored = self.store.get(key)
+        if stored is None or stored.content_type not in RESULT_TYPES.values():
+            if stored is not None:
+                stored.close()
+            return None
+        if len(stored.data) < MAPPED_MIN_BYTES:
+            entry = CachedResult(key, bytes(stored.data), stored.content_type, stored.etag)
+            stored.close()
+        else:
+            entry = CachedResult(key, stored.data, stored.content_type, stored.etag, mapped=True)
+        self._insert(entry)
+        return entry
+
+    def put(self, key, data, content_type):
+        """
+        Store an encoded result, evicting least recently used entries.
+
+        Args:
+            key (str): Result key from result_key()
+            data (bytes): Encoded output
+            content_type (str): MIME type of the output
+
+        Returns:
+            CachedResult: The stored entry
+        """
+        entry = CachedResult(key, data, content_type)
+        self._insert(entry)
+        if self.store is not None:
+            self.store.put(key, data, content_type, etag=entry.etag)
+        return entry
+
+    def _insert(self, entry):
+        with self.lock:
+            old = self.entries.pop(entry.key, None)
+            if old is not None:
+                self._forget(old)
+            if len(entry.data) > self.max_bytes or (entry.mapped and self.max_mapped < 1):
+                return
+            self.entries[entry.key] = entry
+            self.bytes_held += len(entry.data)
+            self.mapped += entry.mapped
+            while self.bytes_held > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self._forget(evicted)
+            if self.mapped > self.max_mapped:
+                for key in [key for key, cached in self.entries.items() if cached.mapped]:
+                    if self.mapped <= self.max_mapped:
+                        break
+                    self._forget(self.entries.pop(key))
+
+    def _forget(self, entry):
+        # Dropping the last reference to a mapped view unmaps it and closes its
+        # descriptor; it isn't closed explicitly because a response that is
+        # still being sent may hold the same view
+        self.bytes_held -= len(entry.data)
+        self.mapped -= entry.mapped
+
+    def stats(self):
+        """Return hit/miss counters and memory use"""
+        with self.lock:
+            stats = {
+                'entries': len(self.entries),
+                'mappedEntries': self.mapped,
+                'bytesHeld': self.bytes_held,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+        if self.store is not None:
+            stats['store'] = self.store.stats()
+        return stats
+
+def result_key(input_bytes, variant='highres'):
+    """
+    Hash an input into a result key.
+
+    Args:
+        input_bytes (bytes): Uploaded file bytes (or any identifying input)
+        variant (str): Name of the processing applied, so different outputs never share a key
+
+    Returns:
+        str: Hex key
+    """
+    digest = hashlib.sha256(variant.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(input_bytes)
+    return digest.hexdigest()[:32]
+
+def result_url(key, extension, section=''):
+    """URL a cached result can be fetched from; section is '' or CHARACTER_RESULT_SECTION"""
+    return f'/results/{section}{key}.{extension}'
+
+def parse_result_path(path):
+    """Split /results/<key>.<ext> into (key, ext), or return None"""
+    for prefix in RESULT_PATH_PREFIXES:
+        if path.startswith(prefix):
+            name = path[len(prefix):]
+            if name.startswith(CHARACTER_RESULT_SECTION):
+                name = name[len(CHARACTER_RESULT_SECTION):]
+            key, _, extension = name.partition('.')
+            if key and extension in RESULT_TYPES and all(c in '0123456789abcdef' for c in key):
+                return key, extension
+    return None
+
+def serve_result(path, headers=None):
+    """
+    Serve a cached result for a GET /results/<key>.<ext> request.
+
+    Args:
+        path (str): Request path
+        headers (dict): Request headers (optional)
+
+    Returns:
+        ServiceResponse: 200 with the result, 304 if the client copy is current, or 404
+    """
+    parsed = parse_result_path(path)
+    entry = get_result_cache().get(parsed[0]) if parsed else None
+    if entry is None or RESULT_TYPES[parsed[1]] != entry.content_type:
+        return ServiceResponse.json(404, {'error': 'Result not found'})
+
+    response_headers = {
+        'ETag': entry.etag,
+        'Cache-Control': RESULT_CACHE_CONTROL,
+    }
+    if etag_matches(get_header(headers, 'If-None-Match'), (entry.etag,)):
+        return ServiceResponse(304, b'', response_headers)
+    response_headers['Content-Type'] = entry.content_type
+    return ServiceResponse(200, entry.data, response_headers)
+
+_cache = None
+
+def get_result_cache():
+    """Return the process-wide result cache"""
+    global _cache
+    if _cache is None:
+        _cache = ResultCache(int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+                             result_store.get_result_store())
+    return _cache
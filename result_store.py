@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped on-disk result store
+Persists processed results across restarts and shares them between worker
+processes. Each entry is one file: a small header (magic, metadata length,
+JSON metadata) followed by the payload, an encoded output (PNG/GIF). Readers
+mmap the file and get a memoryview of the payload, so a hit can be served
+straight from the mapped pages, with no read() copy.
+
+Entry files are written to a temporary name and renamed into place, so a
+reader only ever maps a complete, immutable file, and reads take no lock.
+Writers serialize on a lock file to update index.json (key -> size) and
+evict least recently used entries past max_bytes; a hit touches the entry's
+mtime, which is what eviction orders by. An evicted file that a reader still
+has mapped stays readable until the mapping is dropped.
+"""
+
+import os
+import json
+import mmap
+import struct
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking (e.g. Windows): writers are only serialized within the process
+    fcntl = None
+
+MAGIC = b'PXR1'
+_HEADER = struct.Struct('<4sI')
+
+ENTRY_SUFFIX = '.res'
+INDEX_NAME = 'index.json'
+LOCK_NAME = '.lock'
+
+class StoredResult:
+    """A mapped entry: metadata plus a zero-copy view of the payload"""
+
+    __slots__ = ('key', 'meta', 'data', '_map')
+
+    def __init__(self, key, meta, mapping, offset):
+        self.key = key
+        self.meta = meta
+        self._map = mapping
+        self.data = memoryview(mapping)[offset:offset + meta['size']]
+
+    def close(self):
+        """Unmap the entry; only valid once nothing else uses its data"""
+        self.data.release()
+        self._map.close()
+
+    @property
+    def content_type(self):
+        return self.meta['contentType']
+
+    @property
+    def etag(self):
+        return self.meta.get('etag')
+
+class ResultStore:
+    """
+    Size-bounded store of result files in one directory.
+
+    Args:
+        directory (str): Store directory, created if missing
+        max_bytes (int): Total payload size kept before evicting
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def _map(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            # ValueError: an empty file can't be mapped
+            return self._discard(path, e)
+        try:
+            magic, meta_length = _HEADER.unpack_from(mapping)
+            if magic != MAGIC:
+                raise ValueError("bad magic")
+            offset = _HEADER.size + meta_length
+            meta = json.loads(bytes(mapping[_HEADER.size:offset]))
+            if offset + meta['size'] > len(mapping):
+                raise ValueError("truncated payload")
+            return StoredResult(key, meta, mapping, offset)
+        except (struct.error, ValueError, KeyError, TypeError) as e:
+            mapping.close()
+            return self._discard(path, e)
+
+    def _discard(self, path, error):
+        """Delete a corrupt or truncated entry file so its key becomes a plain miss"""
+        print(f"Result store: discarding unreadable entry {os.path.basename(path)}: {error}")
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        return None
+
+    def get(self, key):
+        """Map the entry for a key, or return None"""
+        entry = self._map(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        try:
+            # Mark as recently used for eviction
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        self.hits += 1
+        return entry
+
+    def put(self, key, data, content_type, **meta):
+        """
+        Store a payload under a key.
+
+        Args:
+            key (str): Result key
+            data (bytes): Encoded output
+            content_type (str): MIME type
+            **meta: Extra metadata kept with the entry (e.g. etag)
+        """
+        if len(data) > self.max_bytes:
+            return
+        header = json.dumps({'contentType': content_type, 'size': len(data), **meta}).encode('utf-8')
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(MAGIC, len(header)))
+                f.write(header)
+                f.write(data)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        with self._writer_lock():
+            index = self._load_index()
+            index[key] = len(data)
+            self._evict(index)
+            self._save_index(index)
+
+    def _evict(self, index):
+        total = sum(index.values())
+        if total <= self.max_bytes:
+            return
+
+        def last_used(key):
+            try:
+                return os.stat(self._path(key)).st_mtime
+            except OSError:
+                return 0
+
+        for key in sorted(index, key=last_used):
+            if total <= self.max_bytes:
+                break
+            total -= index.pop(key)
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_NAME)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return self._scan()
+        if not isinstance(index, dict) or not all(type(size) is int for size in index.values()):
+            return self._scan()
+        return index
+
+    def _scan(self):
+        """Rebuild the index from the entry files"""
+        index = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                entry = self._map(name[:-len(ENTRY_SUFFIX)])
+                if entry is not None:
+                    index[entry.key] = entry.meta['size']
+                    entry.close()
+        return index
+
+    def _save_index(self, index):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.replace(temp_path, os.path.join(self.directory, INDEX_NAME))
+
+    def _writer_lock(self):
+        return _WriterLock(self.lock, os.path.join(self.directory, LOCK_NAME))
+
+    def stats(self):
+        """Return hit/miss counters and disk use"""
+        with self._writer_lock():
+            index = self._load_index()
+        return {
+            'entries': len(index),
+            'bytesHeld': sum(index.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+class _WriterLock:
+    """Thread lock plus an exclusive flock on the store's lock file"""
+
+    def __init__(self, lock, path):
+        self.lock = lock
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        if fcntl is not None:
+            self.file = open(self.path, 'a')
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        self.lock.release()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_result_store():
+    """Return the process-wide store in RESULT_STORE_DIR, or None when it isn't set"""
+    global _store
+    directory = os.environ.get('RESULT_STORE_DIR')
+    if not directory:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore(directory, int(os.environ.get('RESULT_STORE_MAX_BYTES', 256 * 1024 * 1024)))
+        return _store
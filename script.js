@@ -137,27 +137,18 @@ function processImage() {
     // Send to backend - always use high-res upscale
     // Use different endpoints for local development vs production
     const apiEndpoint = window.location.port === '8080' ? '/process-image' : 'https://pixelartsmoother.onrender.com/process-image';
-    fetch(apiEndpoint, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            image: currentImage
-        })
-    })
-    .then(response => response.json())
+    
+    // Poll the job's progress while the request runs
+    const jobId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+    const stopPolling = pollProgress(apiEndpoint.replace('/process-image', '/progress/' + jobId));
+    
+    // Ask for a quick preview first. Servers that can stream send the full
+    // result on the same response; otherwise a preview comes back with
+    // final: false and the full result is fetched with a second request
+    requestProcessing(apiEndpoint, { image: currentImage, jobId: jobId, preview: true })
     .then(data => {
-        if (data.success) {
-            processedImage = data.processedImage;
-            displayProcessedImage();
-            showStatus('Processing complete!', 'success');
-            
-            // Enable download button
-            const downloadBtn = document.getElementById('downloadBtn');
-            if (downloadBtn) downloadBtn.disabled = false;
-        } else {
-            showStatus('Processing failed: ' + data.error, 'error');
+        if (data && data.success && data.final === false) {
+            return requestProcessing(apiEndpoint, { image: currentImage, jobId: jobId });
         }
     })
     .catch(error => {
@@ -165,11 +156,84 @@ function processImage() {
         showStatus('Processing failed. Please try again.', 'error');
     })
     .finally(() => {
+        stopPolling();
         // Hide loading animation
         hideLoadingAnimation();
     });
 }
 
+// POST a processing request and show each result it returns; resolves with the last one
+function requestProcessing(apiEndpoint, payload) {
+    return fetch(apiEndpoint, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'application/x-ndjson, application/json'
+        },
+        body: JSON.stringify(payload)
+    })
+    .then(response => {
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('application/x-ndjson') || !response.body) {
+            return response.json().then(showProcessingResult);
+        }
+        // One JSON result per line, the preview first
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        let last = null;
+        const read = () => reader.read().then(({ done, value }) => {
+            buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => {
+                last = showProcessingResult(JSON.parse(line));
+            });
+            return done ? last : read();
+        });
+        return read();
+    });
+}
+
+// Show a preview or final result from the server and return it
+function showProcessingResult(data) {
+    if (data.success) {
+        processedImage = data.processedImage;
+        displayProcessedImage();
+        if (data.final === false) {
+            showStatus('Preview ready, smoothing...', 'info');
+        } else {
+            showStatus('Processing complete!', 'success');
+        }
+        
+        // Enable download button
+        const downloadBtn = document.getElementById('downloadBtn');
+        if (downloadBtn) downloadBtn.disabled = false;
+    } else {
+        showStatus('Processing failed: ' + data.error, 'error');
+    }
+    return data;
+}
+
+// Show a job's progress every second until the returned function is called
+function pollProgress(progressUrl) {
+    let stopped = false;
+    const timer = setInterval(() => {
+        fetch(progressUrl)
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (!stopped && data && data.state === 'running') {
+                    showStatus(`Processing image... ${Math.round(data.fraction * 100)}%`, 'info');
+                }
+            })
+            .catch(() => {});
+    }, 1000);
+    return () => {
+        stopped = true;
+        clearInterval(timer);
+    };
+}
+
 // Display processed image
 function displayProcessedImage() {
     if (!processedImage) return;
@@ -194,7 +258,8 @@ function downloadProcessedImage() {
     
     const link = document.createElement('a');
     link.href = processedImage;
-    link.download = 'processed_pixel_art.png';
+    // Animated uploads come back as GIFs
+    link.download = processedImage.startsWith('data:image/gif') ? 'processed_pixel_art.gif' : 'processed_pixel_art.png';
     link.click();
     showStatus('Download started!', 'success');
 }
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Transport-independent HTTP response type and header helpers
+Shared by the processing service, the static asset cache and the result
+cache so none of them depend on a particular server implementation.
+"""
+
+import json
+
+class ServiceResponse:
+    """Transport-independent response: status code, headers and a body"""
+
+    def __init__(self, status, body=b'', headers=None):
+        self.status = status
+        self.headers = dict(headers or {})
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+
+    @classmethod
+    def json(cls, status, payload, headers=None):
+        """Build a JSON response"""
+        return cls(status, json.dumps(payload),
+                   {'Content-Type': 'application/json', **(headers or {})})
+
+    @classmethod
+    def error(cls, status, message, headers=None):
+        """Build a JSON error response"""
+        return cls.json(status, {'success': False, 'error': message}, headers)
+
+def etag_matches(if_none_match, etags):
+    """Check an If-None-Match header against the current ETags (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    candidates = [tag[2:] if tag.startswith('W/') else tag for tag in candidates]
+    return any(etag and etag in candidates for etag in etags)
+
+def get_header(headers, name):
+    """Case-insensitive header lookup that works for dicts and http.server headers"""
+    if not headers:
+        return None
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, candidate in headers.items():
+            if key.lower() == lowered:
+                return candidate
+    return value
+
+class RequestError(Exception):
+    """An error the client caused or must react to, mapped to an HTTP status"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = dict(headers or {})
+
+    def to_response(self):
+        """Build the JSON error response for this error"""
+        return ServiceResponse.error(self.status, str(self), self.headers)
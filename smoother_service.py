@@ -0,0 +1,751 @@
+#!/usr/bin/env python3
+"""
+Shared request-handling core for Pixel Art Smoother
+Every entry point (web_backend, local_server and the Vercel functions) runs
+requests through this module, so decoding, processing and encoding live in
+one place. Transports only translate a ServiceResponse to their own format.
+"""
+
+import os
+import json
+import time
+import base64
+import select
+import socket
+import hashlib
+import itertools
+import threading
+import traceback
+from io import BytesIO
+
+import warm_cache
+import engines
+import admission
+import static_assets
+import result_cache
+from progress import Progress, CancellationToken, Cancelled, get_job_registry
+from service_response import ServiceResponse, RequestError, get_header
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type'
+}
+
+GIF_CHARACTERS = {
+    'samus': ('samusGif', 'samus.gif'),
+    'fei': ('feiGif', 'fei.gif'),
+    'bart': ('bartGif', 'bart.gif'),
+}
+
+PROGRESS_PATH_PREFIXES = ('/progress/', '/api/progress/')
+
+# Cheap results sent ahead of the full pipeline: nearest-neighbour 2x, or the
+# first (lowResUpscale) half of the pipeline
+PREVIEW_MODES = ('upscale', 'lowres')
+
+NDJSON = 'application/x-ndjson'
+
+_stats = {
+    'requests': 0,
+    'errors': 0,
+    'processing_ms': 0.0,
+}
+
+def decode_image_data(image_data):
+    """
+    Decode base64 (optionally data URL) image data into the uploaded file bytes.
+
+    Args:
+        image_data (str): Base64 image data or a data:image/... URL
+
+    Returns:
+        bytes: The uploaded file
+    """
+    if not image_data:
+        raise ValueError("No image data provided")
+
+    if image_data.startswith('data:image/'):
+        image_data = image_data.split(',')[1]
+
+    return base64.b64decode(image_data)
+
+def open_upload(image_bytes):
+    """Open uploaded file bytes without decoding pixels, checking the size limits"""
+    Image = warm_cache.get_pil_image()
+    image = Image.open(BytesIO(image_bytes))
+
+    # Image.open only parses the header, so this runs before any pixel decoding
+    admission.check_image_size(image.width, image.height)
+    return image
+
+def is_animated(image):
+    """Whether an opened upload has more than one frame (animated GIF/APNG/WebP)"""
+    return getattr(image, 'n_frames', 1) > 1
+
+def open_image(image_bytes):
+    """Open uploaded file bytes as an RGB PIL image"""
+    return to_rgb(open_upload(image_bytes))
+
+def to_rgb(image):
+    """Convert an opened image to RGB for the pipeline"""
+    # Convert image to RGB format if needed
+    if image.mode != 'RGB':
+        print(f"Converting image from {image.mode} to RGB")
+        image = image.convert('RGB')
+    return image
+
+def decode_image(image_data):
+    """
+    Decode a base64 (optionally data URL) image into an RGB PIL image.
+
+    Args:
+        image_data (str): Base64 image data or a data:image/... URL
+
+    Returns:
+        PIL.Image.Image: The decoded image in RGB mode
+    """
+    return open_image(decode_image_data(image_data))
+
+def encode_image(image, format='PNG'):
+    """Encode a PIL image and return the raw bytes"""
+    output_buffer = BytesIO()
+    image.save(output_buffer, format=format)
+    return output_buffer.getvalue()
+
+def to_data_url(data, mime_type):
+    """Wrap raw bytes in a base64 data URL"""
+    return f'data:{mime_type};base64,{base64.b64encode(data).decode("utf-8")}'
+
+def resolve_engine(name=None):
+    """Look up a smoothing engine, turning unknown names into a 400"""
+    try:
+        return engines.get_engine(name)
+    except ValueError as e:
+        raise RequestError(400, str(e))
+
+def upscale_image(image, engine_name=None, progress=None, thresholds=engines.DEFAULT_THRESHOLDS):
+    """
+    Run the full smoothing pipeline on a decoded image, reporting to progress if given.
+
+    thresholds is an engines.Thresholds, or 'auto' to pick them from the image.
+    """
+    engine = resolve_engine(engine_name)
+    print(f"Processing image: {image.width}x{image.height} pixels ({engine.name} engine)")
+    if thresholds == 'auto':
+        import thresholds as adaptive
+        thresholds, _ = adaptive.analyze(image)
+        print(f"Adaptive thresholds: {tuple(thresholds)}")
+
+    # Always use high-res upscale
+    processed_image = engine.highResUpscale(image, progress, thresholds)
+
+    print(f"Processing complete: {processed_image.width}x{processed_image.height} pixels")
+    return processed_image
+
+def sprite_sheet_options(value):
+    """
+    Parse the 'spriteSheet' request field.
+
+    Args:
+        value: true to detect the grid, or {"columns": c, "rows": r}
+
+    Returns:
+        tuple: (columns, rows), or None to detect the grid from gutters
+    """
+    if value is True:
+        return None
+    try:
+        return int(value['columns']), int(value['rows'])
+    except (TypeError, KeyError, ValueError):
+        raise RequestError(400, "spriteSheet must be true or {\"columns\": c, \"rows\": r}")
+
+def threshold_options(value):
+    """
+    Parse the 'thresholds' request field.
+
+    Args:
+        value: "auto", "default" or {"scale", "scale2", "extraScale", "extraScale2"}
+
+    Returns:
+        engines.Thresholds, or 'auto' to pick them from the image
+    """
+    if value == 'auto':
+        return 'auto'
+    import thresholds
+    try:
+        return thresholds.parse_thresholds(value)
+    except ValueError as e:
+        raise RequestError(400, str(e))
+
+def sweep_options(value):
+    """Parse the 'sweep' request field: a list of 'thresholds' values"""
+    import thresholds
+    if not isinstance(value, list) or not value:
+        raise RequestError(400, "sweep must be a non-empty list of thresholds")
+    if len(value) > thresholds.MAX_SWEEP_VARIANTS:
+        raise RequestError(400, f"sweep is limited to {thresholds.MAX_SWEEP_VARIANTS} variants")
+    return [threshold_options(item) for item in value]
+
+def threshold_variant(option):
+    """Result cache variant for a 'thresholds' option; the defaults share 'highres'"""
+    if option == 'auto':
+        return 'highres-auto'
+    if option == engines.DEFAULT_THRESHOLDS:
+        return 'highres'
+    return 'highres-' + '-'.join(str(value) for value in option)
+
+def preview_mode(value):
+    """Parse the 'preview' request field: true means 'upscale'"""
+    if value is True:
+        return 'upscale'
+    if value in PREVIEW_MODES:
+        return value
+    raise RequestError(400, f"preview must be true or one of: {', '.join(PREVIEW_MODES)}")
+
+def preview_image(image, mode, engine_name=None):
+    """Render a preview: plain 2x upscale, or the lowResUpscale stage"""
+    engine = resolve_engine(engine_name)
+    if mode == 'lowres':
+        with admission.get_admission_controller().admit(image.width * image.height):
+            return engine.lowResUpscale(image)
+    return engine.upscale(image)
+
+def upscale_sprite_sheet(image, grid=None, engine_name=None, progress=None):
+    """Run the pipeline on each cell of a sprite sheet, reporting to progress per batch of cells"""
+    import sprite_sheet
+    resolve_engine(engine_name)
+    print(f"Processing sprite sheet: {image.width}x{image.height} pixels")
+    if progress is not None:
+        # The cells are reported as one stage
+        progress.stages = 1
+    try:
+        processed_image, _ = sprite_sheet.process_sheet(image, engine_name, grid, progress=progress)
+    except ValueError as e:
+        raise RequestError(400, str(e))
+    return processed_image
+
+def upscale_animation(animation, engine_name=None, cancel_token=None):
+    """
+    Run every frame of an animated upload through the pipeline.
+
+    Identical frames are hashed and processed once. A first pass keeps only
+    each frame's hash; the second reads the frames again, streams the first
+    occurrence of each through the bounded parallel animation pipeline and
+    writes every output frame as soon as it is ready. An upscaled frame is
+    held only while a later frame still repeats it. Frame durations and the
+    loop count are carried over to the output.
+
+    Args:
+        animation (PIL.Image.Image): Opened multi-frame image
+        engine_name (str): Smoothing engine (optional)
+        cancel_token (CancellationToken): Checked for every input and output frame (optional)
+
+    Returns:
+        bytes: The upscaled animation as a GIF
+    """
+    import animation_stream
+    engine = resolve_engine(engine_name)
+    admission.check_frame_count(animation.n_frames)
+    print(f"Processing animation: {animation.n_frames} frames of {animation.width}x{animation.height} pixels "
+          f"({engine.name} engine)")
+
+    def check_cancelled():
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+    frames = []
+    last_use = {}
+    for index, (image, duration) in enumerate(animation_stream.iter_image_frames(animation)):
+        check_cancelled()
+        key = hashlib.sha256(image.tobytes()).digest()
+        frames.append((key, duration))
+        last_use[key] = index
+
+    def first_occurrences():
+        seen = set()
+        for (key, _), (image, _) in zip(frames, animation_stream.iter_image_frames(animation)):
+            check_cancelled()
+            if key not in seen:
+                seen.add(key)
+                yield image, 0
+
+    # Results come back in first-occurrence order, which is the order the
+    # writer first needs them in
+    upscaled = animation_stream.upscale_frames(first_occurrences(), engine.name)
+    results = {}
+    output = BytesIO()
+    with animation_stream.GifStreamWriter(output, animation.info.get('loop')) as writer:
+        for index, (key, duration) in enumerate(frames):
+            check_cancelled()
+            if key not in results:
+                results[key], _ = next(upscaled)
+            writer.write(results[key], duration)
+            if last_use[key] == index:
+                del results[key]
+    print(f"Processing complete: {len(frames)} frames, {len(last_use)} unique")
+    return output.getvalue()
+
+def _timed(label, func, *args):
+    """Run a request function, recording timing and turning exceptions into 500s"""
+    started = time.perf_counter()
+    _stats['requests'] += 1
+    try:
+        response = func(*args)
+    except RequestError as e:
+        _stats['errors'] += 1
+        print(f"Rejected request {label}: {e}")
+        response = e.to_response()
+    except Exception as e:
+        _stats['errors'] += 1
+        print(f"Error {label}: {e}")
+        traceback.print_exc()
+        response = ServiceResponse.error(500, str(e))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _stats['processing_ms'] += elapsed_ms
+    response.headers['Server-Timing'] = f'app;dur={elapsed_ms:.1f}'
+    return response
+
+def _result_response(entry, payload_field, extension, section='', **extra):
+    """JSON response for a cached result, with its ETag and result URL"""
+    return ServiceResponse.json(200, {
+        'success': True,
+        payload_field: to_data_url(entry.data, entry.content_type),
+        'resultUrl': result_cache.result_url(entry.key, extension, section),
+        'etag': entry.etag,
+        **extra
+    }, {'ETag': entry.etag})
+
+def _tracked(progress, func, *args):
+    """Run func, recording on progress whether it finished, failed or was cancelled"""
+    try:
+        result = func(*args)
+    except Cancelled:
+        progress.finish('cancelled')
+        raise
+    except Exception:
+        progress.finish('failed')
+        raise
+    progress.finish()
+    return result
+
+def _process_image(body, cancel_token=None, allow_preview=True):
+    admission.check_body_size(len(body))
+    data = json.loads(body)
+    if not allow_preview:
+        data.pop('preview', None)
+
+    # Clients that send a jobId can poll /progress/<jobId> or cancel the job
+    progress = Progress(token=cancel_token)
+    if data.get('jobId'):
+        get_job_registry().register(str(data['jobId']), progress)
+    return _tracked(progress, _process_upload, data, progress)
+
+def _process_upload(data, progress):
+    image_bytes = decode_image_data(data.get('image'))
+
+    sprite_sheet = data.get('spriteSheet')
+    grid = sprite_sheet_options(sprite_sheet) if sprite_sheet else None
+    thresholds = threshold_options(data.get('thresholds'))
+    # Checked up front so a cached result can't hide an unknown engine
+    resolve_engine(data.get('engine'))
+    custom = thresholds != engines.DEFAULT_THRESHOLDS or data.get('sweep') is not None
+    if sprite_sheet and custom:
+        raise RequestError(400, "thresholds and sweep are not supported for sprite sheets")
+    if data.get('sweep') is not None:
+        return _process_sweep(image_bytes, data, progress)
+
+    cache = result_cache.get_result_cache()
+    if not sprite_sheet:
+        variant = threshold_variant(thresholds)
+    elif grid:
+        variant = f'sprite-{grid[0]}x{grid[1]}'
+    else:
+        variant = 'sprite'
+    key = result_cache.result_key(image_bytes, variant)
+    entry = cache.get(key)
+    if entry is None:
+        upload = open_upload(image_bytes)
+        if is_animated(upload):
+            if custom:
+                raise RequestError(400, "thresholds are not supported for animations")
+            cost = upload.width * upload.height * upload.n_frames
+            with admission.get_admission_controller().admit(cost):
+                entry = cache.put(key, upscale_animation(upload, data.get('engine'), progress.token), 'image/gif')
+            return _result_response(entry, 'processedImage', 'gif')
+        image = to_rgb(upload)
+        if data.get('preview'):
+            mode = preview_mode(data['preview'])
+            # Not cached: the client follows up with a full request, whose
+            # result then lands at resultUrl
+            return ServiceResponse.json(200, {
+                'success': True,
+                'processedImage': to_data_url(encode_image(preview_image(image, mode, data.get('engine'))), 'image/png'),
+                'preview': mode,
+                'final': False,
+                'resultUrl': result_cache.result_url(key, 'png'),
+            }, {'Cache-Control': 'no-store'})
+        with admission.get_admission_controller().admit(image.width * image.height):
+            # The job may have been cancelled while it waited for a slot
+            progress.token.raise_if_cancelled()
+            if sprite_sheet:
+                processed_image = upscale_sprite_sheet(image, grid, data.get('engine'), progress)
+            else:
+                processed_image = upscale_image(image, data.get('engine'), progress, thresholds)
+            png_data = encode_image(processed_image)
+        entry = cache.put(key, png_data, 'image/png')
+    else:
+        print(f"Result cache hit: {key}")
+    extension = 'gif' if entry.content_type == 'image/gif' else 'png'
+    return _result_response(entry, 'processedImage', extension)
+
+def _process_sweep(image_bytes, data, progress):
+    """Render every requested threshold variant, sharing their common stages"""
+    import thresholds as adaptive
+    options = sweep_options(data['sweep'])
+    engine = resolve_engine(data.get('engine'))
+    upload = open_upload(image_bytes)
+    if is_animated(upload):
+        raise RequestError(400, "sweep is not supported for animations")
+    image = to_rgb(upload)
+    variants = [adaptive.analyze(image)[0] if option == 'auto' else option for option in options]
+
+    # Each variant is cached on its own, so a later request for the chosen
+    # thresholds is a cache hit
+    cache = result_cache.get_result_cache()
+    keys = {variant: result_cache.result_key(image_bytes, threshold_variant(variant)) for variant in variants}
+    entries = {variant: cache.get(key) for variant, key in keys.items()}
+    missing = [variant for variant, entry in entries.items() if entry is None]
+    if missing:
+        print(f"Sweeping {len(missing)} threshold variants of {image.width}x{image.height} pixels ({engine.name} engine)")
+        with admission.get_admission_controller().admit(image.width * image.height * len(missing)):
+            progress.token.raise_if_cancelled()
+            images, counts = adaptive.sweep(image, missing, engine.name, progress.token)
+        print(f"Sweep complete: {counts['stagesRun']} stages run, {counts['stagesShared']} shared")
+        for variant, processed_image in zip(missing, images):
+            entries[variant] = cache.put(keys[variant], encode_image(processed_image), 'image/png')
+
+    return ServiceResponse.json(200, {
+        'success': True,
+        'variants': [{
+            'thresholds': adaptive.thresholds_dict(variant),
+            'processedImage': to_data_url(entries[variant].data, entries[variant].content_type),
+            'resultUrl': result_cache.result_url(entries[variant].key, 'png'),
+            'etag': entries[variant].etag,
+        } for variant in variants],
+    })
+
+def _create_gif(body, cancel_token=None):
+    admission.check_body_size(len(body))
+    data = json.loads(body)
+    character = data.get('character')
+
+    if not character:
+        raise ValueError("No character specified")
+    if character not in GIF_CHARACTERS:
+        raise ValueError(f"Unknown character: {character}")
+
+    function_name, gif_filename = GIF_CHARACTERS[character]
+    cache = result_cache.get_result_cache()
+    key = result_cache.result_key(character.encode('utf-8'), 'character-gif')
+    entry = cache.get(key)
+    if entry is None:
+        # Create GIF based on character
+        with admission.get_admission_controller().admit(admission.GIF_WORK_ESTIMATE):
+            result = getattr(warm_cache.get_pipeline(), function_name)()
+
+        # Read the generated GIF file
+        if not result or not os.path.exists(gif_filename):
+            raise Exception("GIF creation failed")
+        with open(gif_filename, 'rb') as f:
+            entry = cache.put(key, f.read(), 'image/gif')
+
+    return _result_response(entry, 'gifData', 'gif', result_cache.CHARACTER_RESULT_SECTION, filename=gif_filename)
+
+def _cancel_job(body, cancel_token=None):
+    data = json.loads(body)
+    job_id = data.get('jobId')
+    if not job_id:
+        raise RequestError(400, "No jobId specified")
+    if not get_job_registry().cancel(str(job_id)):
+        return ServiceResponse.json(404, {'error': f'Unknown job: {job_id}'})
+    return ServiceResponse.json(200, {'success': True, 'jobId': job_id})
+
+def process_image(body, cancel_token=None, allow_preview=True):
+    """
+    Handle an image processing request.
+
+    Args:
+        body (str or bytes): JSON request body with an 'image' field, and
+            optionally 'engine', 'spriteSheet' (true, or {"columns", "rows"}),
+            'jobId' (to poll progress or cancel), 'preview' (true, or one of
+            PREVIEW_MODES), 'thresholds' ("auto", or {"scale", "scale2",
+            "extraScale", "extraScale2"}) and 'sweep' (a list of thresholds,
+            answered with one image per variant); animated uploads come back
+            as an animated GIF
+        cancel_token (CancellationToken): Cancels the run when set, e.g. on client disconnect (optional)
+        allow_preview (bool): Honour the 'preview' field; a preview response
+            has "final": false and the client asks again without it
+
+    Returns:
+        ServiceResponse: JSON response with the processed image as a data URL
+    """
+    return _timed('processing image', _process_image, body, cancel_token, allow_preview)
+
+def process_image_progressive(body, cancel_token=None):
+    """
+    Yield a preview response and then the full result.
+
+    A cached full result is yielded on its own, as is an error; uploads
+    without a 'preview' field get the full result only.
+
+    Args:
+        body (str or bytes): JSON request body as for process_image
+        cancel_token (CancellationToken): Cancels the run when set (optional)
+
+    Yields:
+        ServiceResponse: JSON responses, the last one final
+    """
+    first = process_image(body, cancel_token)
+    yield first
+    if first.status == 200 and json.loads(first.body).get('final') is False:
+        yield process_image(body, cancel_token, allow_preview=False)
+
+def create_gif(body, cancel_token=None):
+    """
+    Handle a GIF creation request.
+
+    Args:
+        body (str or bytes): JSON request body with a 'character' field
+        cancel_token (CancellationToken): Unused; character GIFs are cached after the first run
+
+    Returns:
+        ServiceResponse: JSON response with the GIF as a data URL
+    """
+    return _timed('creating GIF', _create_gif, body, cancel_token)
+
+def cancel_job(body, cancel_token=None):
+    """
+    Cancel a running job started with a jobId.
+
+    Args:
+        body (str or bytes): JSON request body with a 'jobId' field
+
+    Returns:
+        ServiceResponse: 200 if the job was found, 404 otherwise
+    """
+    return _timed('cancelling job', _cancel_job, body, cancel_token)
+
+def progress_job_id(path):
+    """Job id from a /progress/<jobId> path, or None"""
+    for prefix in PROGRESS_PATH_PREFIXES:
+        if path.startswith(prefix) and len(path) > len(prefix):
+            return path[len(prefix):]
+    return None
+
+def job_progress(job_id):
+    """Progress snapshot of a job, for polling clients"""
+    progress = get_job_registry().get(job_id)
+    if progress is None:
+        return ServiceResponse.json(404, {'error': f'Unknown job: {job_id}'})
+    return ServiceResponse.json(200, {'jobId': job_id, **progress.snapshot()}, {'Cache-Control': 'no-store'})
+
+POST_ROUTES = {
+    '/process-image': process_image,
+    '/api/process-image': process_image,
+    '/create-gif': create_gif,
+    '/api/create-gif': create_gif,
+    '/cancel': cancel_job,
+    '/api/cancel': cancel_job,
+}
+
+# Routes that can send several responses as NDJSON lines to streaming transports
+STREAM_ROUTES = {
+    '/process-image': process_image_progressive,
+    '/api/process-image': process_image_progressive,
+}
+
+def handle_post(path, body, headers=None, cancel_token=None):
+    """Route a POST request to the matching service function"""
+    route = POST_ROUTES.get(path)
+    if route is None:
+        return ServiceResponse.json(404, {'error': 'Endpoint not found'})
+    return route(body, cancel_token)
+
+def handle_get(path, query=None, headers=None):
+    """Serve a GET request: stats, job progress, cached results, then static files"""
+    if path in ('/stats', '/api/stats'):
+        return _stats_response()
+    job_id = progress_job_id(path)
+    if job_id:
+        return job_progress(job_id)
+    if result_cache.parse_result_path(path):
+        return result_cache.serve_result(path, headers)
+    return static_assets.serve_static(path, query, headers)
+
+def stats():
+    """Return request counters collected across all transports"""
+    return dict(_stats)
+
+def _stats_response():
+    # Imported here: the buffer pool pulls in Pillow, which cold starts defer
+    import buffer_pool
+    return ServiceResponse.json(200, {
+        'service': stats(),
+        'resultCache': result_cache.get_result_cache().stats(),
+        'admission': admission.get_admission_controller().stats(),
+        'bufferPool': buffer_pool.get_buffer_pool().stats(),
+        'engine': engines.default_engine_name(),
+    }, {'Cache-Control': 'no-store'})
+
+# Transports
+
+def to_vercel_response(response, extra_headers=None):
+    """
+    Convert a ServiceResponse into a Vercel-style response dict.
+
+    Args:
+        response (ServiceResponse): Response to convert
+        extra_headers (dict): Headers added to the response, e.g. CORS (optional)
+
+    Returns:
+        dict: Response with statusCode, headers and body
+    """
+    headers = {**(extra_headers if extra_headers is not None else CORS_HEADERS), **response.headers}
+    if is_text_response(response):
+        return {
+            'statusCode': response.status,
+            'headers': headers,
+            'body': response.body.decode('utf-8')
+        }
+    return {
+        'statusCode': response.status,
+        'headers': headers,
+        'body': base64.b64encode(response.body).decode('utf-8'),
+        'isBase64Encoded': True
+    }
+
+def is_text_response(response):
+    """Whether a response body can be sent as a plain string"""
+    if 'Content-Encoding' in response.headers:
+        return False
+    content_type = response.headers.get('Content-Type', 'text/plain')
+    return content_type.startswith(('text/', 'application/json', 'application/javascript'))
+
+def read_http_body(handler):
+    """
+    Read the request body from a BaseHTTPRequestHandler.
+
+    The declared Content-Length is checked before anything is read, so an
+    oversized upload is refused without buffering it.
+
+    Raises:
+        RequestError: 411 without a Content-Length, 400 if it isn't a
+            non-negative integer, 413 if it is over the body size limit
+    """
+    declared = handler.headers.get('Content-Length')
+    if declared is None:
+        raise RequestError(411, "Content-Length required")
+    try:
+        content_length = int(declared)
+    except ValueError:
+        content_length = -1
+    # int() also accepts signs, spaces and underscores, so check the digits
+    if content_length < 0 or not declared.strip().isdigit():
+        raise RequestError(400, f"Invalid Content-Length: {declared!r}")
+    admission.check_body_size(content_length)
+    return handler.rfile.read(content_length)
+
+def serve_http_post(handler, path):
+    """Read, route and answer a POST request on a BaseHTTPRequestHandler"""
+    try:
+        body = read_http_body(handler)
+    except RequestError as e:
+        # The unread body is still on the socket, so don't reuse the connection
+        handler.close_connection = True
+        send_http_response(handler, e.to_response())
+        return
+
+    token = CancellationToken()
+    stop_watching = watch_disconnect(handler, token)
+    try:
+        if path in STREAM_ROUTES and NDJSON in (get_header(handler.headers, 'Accept') or ''):
+            stream_http_responses(handler, STREAM_ROUTES[path](body, token))
+        else:
+            send_http_response(handler, handle_post(path, body, handler.headers, token))
+    except (BrokenPipeError, ConnectionResetError):
+        handler.close_connection = True
+        print(f"Client disconnected before the {path} response was sent")
+    finally:
+        stop_watching()
+
+def stream_http_responses(handler, responses):
+    """
+    Send a sequence of JSON ServiceResponses as one NDJSON response.
+
+    Each response body is written as a line as soon as it is produced. If the
+    first response is an error it is sent on its own, with its status.
+    """
+    responses = iter(responses)
+    first = next(responses)
+    if first.status != 200:
+        send_http_response(handler, first)
+        return
+    # No Content-Length: the body ends when the connection closes
+    handler.close_connection = True
+    handler.send_response(200)
+    handler.send_header('Content-Type', NDJSON)
+    handler.send_header('Cache-Control', 'no-store')
+    handler.send_header('Access-Control-Allow-Origin', '*')
+    handler.end_headers()
+    for response in itertools.chain([first], responses):
+        handler.wfile.write(response.body + b'\n')
+        handler.wfile.flush()
+
+def watch_disconnect(handler, token, interval=0.25):
+    """
+    Cancel token if the client of a BaseHTTPRequestHandler closes its connection.
+
+    Once the request body has been read, the socket only becomes readable
+    when the client sends more data or goes away; a zero-byte peek means it
+    went away.
+
+    Returns:
+        callable: Stops the watcher
+    """
+    stopped = threading.Event()
+
+    def watch():
+        connection = handler.connection
+        while not stopped.wait(interval):
+            try:
+                readable, _, _ = select.select([connection], [], [], 0)
+                if not readable:
+                    continue
+                if not connection.recv(1, socket.MSG_PEEK):
+                    print("Client disconnected, cancelling request")
+                    token.cancel()
+            except (OSError, ValueError):
+                token.cancel()
+            # Either way there's nothing more to learn from the socket
+            return
+
+    threading.Thread(target=watch, daemon=True).start()
+    return stopped.set
+
+def send_http_response(handler, response):
+    """
+    Write a ServiceResponse through a BaseHTTPRequestHandler.
+
+    Args:
+        handler (BaseHTTPRequestHandler): Handler for the current request
+        response (ServiceResponse): Response to send
+    """
+    handler.send_response(response.status)
+    for name, value in response.headers.items():
+        handler.send_header(name, value)
+    if response.status != 304:
+        handler.send_header('Content-Length', str(len(response.body)))
+    handler.send_header('Access-Control-Allow-Origin', '*')
+    handler.end_headers()
+    handler.wfile.write(response.body)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Sprite-sheet processing for Pixel Art Smoother
+A sprite sheet is a grid of independent sprites, usually separated by
+gutters of a flat background colour. Running highResUpscale on the whole
+sheet smooths across neighbouring cells and spends most of its time on empty
+background, so sheets are split into cells instead: empty cells are skipped,
+identical cells are processed once, the rest run in a worker pool, and the
+results are pasted back at 4x their original position.
+"""
+
+import os
+import hashlib
+from collections import Counter
+
+from PIL import Image
+
+from engines import get_engine, map_in_pool
+
+# The pipeline doubles twice
+SCALE = 4
+
+def _upscale_cell(engine_name, image):
+    """Worker entry point: run highResUpscale on one cell"""
+    return get_engine(engine_name).highResUpscale(image)
+
+def background_color(image):
+    """Guess the sheet background: the most common of the four corner pixels"""
+    width, height = image.size
+    corners = [image.getpixel(xy) for xy in ((0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1))]
+    return Counter(corners).most_common(1)[0][0]
+
+def _spans(flags):
+    """Return (start, stop) runs where flags is False, i.e. runs of content"""
+    spans = []
+    start = None
+    for index, empty in enumerate(flags):
+        if not empty and start is None:
+            start = index
+        elif empty and start is not None:
+            spans.append((start, index))
+            start = None
+    if start is not None:
+        spans.append((start, len(flags)))
+    return spans
+
+def detect_grid(image, background=None):
+    """
+    Find the cell layout from background-coloured gutter rows and columns.
+
+    Args:
+        image (PIL.Image.Image): RGB sprite sheet
+        background (tuple): Background colour (optional, guessed from the corners)
+
+    Returns:
+        list: Cell boxes (left, top, right, bottom); one box covering the whole
+            sheet when no gutters are found
+    """
+    background = background or background_color(image)
+    width, height = image.size
+    data = image.tobytes()
+    stride = width * 3
+    empty_row = bytes(background) * width
+    rows = [data[y * stride:(y + 1) * stride] == empty_row for y in range(height)]
+    # Transposing makes every column one contiguous row of bytes
+    column_data = image.transpose(Image.Transpose.TRANSPOSE).tobytes()
+    empty_column = bytes(background) * height
+    columns = [column_data[x * height * 3:(x + 1) * height * 3] == empty_column for x in range(width)]
+
+    row_spans, column_spans = _spans(rows), _spans(columns)
+    if not row_spans or not column_spans:
+        return [(0, 0, width, height)]
+    # Keep one gutter pixel around each cell where there is one, so sprite
+    # edges are smoothed against the background rather than the cell border
+    return [(max(left - 1, 0), max(top - 1, 0), min(right + 1, width), min(bottom + 1, height))
+            for top, bottom in row_spans for left, right in column_spans]
+
+def split_grid(image, columns, rows):
+    """
+    Split a sheet into a columns x rows grid of equal cells.
+
+    Raises:
+        ValueError: If the grid does not divide the sheet evenly
+    """
+    width, height = image.size
+    if columns < 1 or rows < 1 or width % columns or height % rows:
+        raise ValueError(f"A {columns}x{rows} grid does not divide a {width}x{height} sheet evenly")
+    cell_width, cell_height = width // columns, height // rows
+    return [(x * cell_width, y * cell_height, (x + 1) * cell_width, (y + 1) * cell_height)
+            for y in range(rows) for x in range(columns)]
+
+def _is_empty(cell, background):
+    return cell.tobytes() == bytes(background) * (cell.width * cell.height)
+
+def _cell_key(cell):
+    return hashlib.sha256(cell.tobytes()).hexdigest() + f':{cell.width}x{cell.height}'
+
+def _map_cells(engine, cells, workers=None, progress=None):
+    """
+    Run highResUpscale on each cell, in worker processes when there are several.
+
+    Cells go out in batches of workers (one at a time inline), and progress,
+    if given, is updated and checked for cancellation between batches.
+    """
+    workers = workers or int(os.environ.get('SPRITE_WORKERS', os.cpu_count() or 1))
+    parallel = len(cells) >= 2 and workers >= 2
+    batch = workers if parallel else 1
+    results = []
+    for start in range(0, len(cells), batch):
+        if progress is not None:
+            progress.update('cells', start, len(cells))
+        chunk = cells[start:start + batch]
+        if parallel:
+            results.extend(map_in_pool(_upscale_cell, [(engine.name, cell) for cell in chunk], workers, 'Sprite sheet'))
+        else:
+            results.extend(engine.highResUpscale(cell) for cell in chunk)
+    if progress is not None:
+        progress.end('cells')
+    return results
+
+def process_sheet(image, engine_name=None, grid=None, background=None, workers=None, progress=None):
+    """
+    Upscale a sprite sheet cell by cell.
+
+    Args:
+        image (PIL.Image.Image): RGB sprite sheet
+        engine_name (str): Smoothing engine (optional, defaults to the selected one)
+        grid (tuple): (columns, rows) to split evenly (optional, detected from gutters)
+        background (tuple): Background colour (optional, guessed from the corners)
+        workers (int): Cells in flight in the shared worker pool (optional,
+            defaults to SPRITE_WORKERS or the CPU count); below 2 runs inline
+        progress (Progress): Reported to per batch of cells, as a single
+            stage, and checked for cancellation (optional)
+
+    Returns:
+        tuple: (PIL.Image.Image, dict) the 4x sheet and cell counts
+    """
+    engine = get_engine(engine_name)
+    background = background or background_color(image)
+    boxes = split_grid(image, *grid) if grid else detect_grid(image, background)
+
+    # Background is uniform, so its upscale is too; fill with whatever the
+    # engine turns it into (brighten shifts it) and paste cells on top
+    sample = engine.highResUpscale(Image.new('RGB', (3, 3), background))
+    out = Image.new('RGB', (image.width * SCALE, image.height * SCALE), sample.getpixel((0, 0)))
+
+    cells = {}
+    placements = []
+    empty = 0
+    for box in boxes:
+        cell = image.crop(box)
+        if _is_empty(cell, background):
+            empty += 1
+            continue
+        key = _cell_key(cell)
+        cells.setdefault(key, cell)
+        placements.append((key, box))
+
+    results = dict(zip(cells, _map_cells(engine, list(cells.values()), workers, progress)))
+    for key, (left, top, right, bottom) in placements:
+        out.paste(results[key], (left * SCALE, top * SCALE))
+
+    print(f"Sprite sheet: {len(boxes)} cells, {empty} empty, {len(cells)} unique")
+    return out, {'cells': len(boxes), 'empty': empty, 'unique': len(cells)}
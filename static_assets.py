@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+In-memory static asset cache for Pixel Art Smoother
+Static files are read once at startup and kept with their gzip-compressed
+bytes and content hashes, so GET requests never touch the disk and browsers
+can revalidate with If-None-Match or cache fingerprinted URLs for good.
+"""
+
+import os
+import re
+import gzip
+import hashlib
+
+from service_response import ServiceResponse, etag_matches, get_header
+
+STATIC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.ttf': 'font/ttf',
+}
+
+# Already-compressed formats gain nothing from gzip
+COMPRESSIBLE = ('.html', '.css', '.js', '.ttf')
+
+# Files referenced from other assets are rewritten to name?v=<fingerprint>,
+# so they can be cached forever; the entry page itself must revalidate
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+class StaticAsset:
+    """A static file held in memory with its gzip variant and content hash"""
+
+    def __init__(self, name, content):
+        self.name = name
+        self.content = content
+        self.content_type = CONTENT_TYPES[os.path.splitext(name)[1].lower()]
+        digest = hashlib.sha256(content).hexdigest()
+        self.fingerprint = digest[:12]
+        self.etag = f'"{digest[:16]}"'
+        self.gzip_content = None
+        self.gzip_etag = None
+        if name.lower().endswith(COMPRESSIBLE):
+            compressed = gzip.compress(content, mtime=0)
+            if len(compressed) < len(content):
+                self.gzip_content = compressed
+                self.gzip_etag = f'"{digest[:16]}-gz"'
+
+class AssetCache:
+    """Startup-loaded cache of every servable file in a directory"""
+
+    def __init__(self, directory=STATIC_DIR):
+        self.directory = directory
+        self.assets = {}
+
+    def load(self):
+        """
+        Read all static files, fingerprint them and rewrite references.
+
+        Leaf assets (images, fonts, scripts) are loaded first so that the
+        stylesheet and then index.html can point at their fingerprinted URLs.
+
+        Returns:
+            int: Number of assets loaded
+        """
+        names = sorted(name for name in os.listdir(self.directory)
+                       if os.path.splitext(name)[1].lower() in CONTENT_TYPES
+                       and os.path.isfile(os.path.join(self.directory, name)))
+        order = {'.css': 1, '.html': 2}
+        for name in sorted(names, key=lambda n: order.get(os.path.splitext(n)[1].lower(), 0)):
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                content = f.read()
+            if name.lower().endswith(('.css', '.html')):
+                content = self.fingerprint_references(content)
+            self.assets[name] = StaticAsset(name, content)
+        return len(self.assets)
+
+    def fingerprint_references(self, content):
+        """Rewrite quoted references to loaded assets as name?v=<fingerprint>"""
+        text = content.decode('utf-8')
+        for name, asset in self.assets.items():
+            pattern = r'''(["'(])''' + re.escape(name) + r'''(["')])'''
+            text = re.sub(pattern, lambda m: f'{m.group(1)}{name}?v={asset.fingerprint}{m.group(2)}', text)
+        return text.encode('utf-8')
+
+    def get(self, name):
+        """
+        Look up an asset, loading files that appeared after startup (e.g. generated GIFs).
+
+        Args:
+            name (str): File name relative to the static directory
+
+        Returns:
+            StaticAsset: The asset, or None if it does not exist
+        """
+        asset = self.assets.get(name)
+        if asset is not None:
+            return asset
+        if '/' in name or '\\' in name or name.startswith('.'):
+            return None
+        if os.path.splitext(name)[1].lower() not in CONTENT_TYPES:
+            return None
+        path = os.path.join(self.directory, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            asset = StaticAsset(name, f.read())
+        self.assets[name] = asset
+        return asset
+
+    def serve(self, path, query=None, headers=None):
+        """
+        Build the response for a static GET request.
+
+        Args:
+            path (str): Request path, e.g. '/styles.css'
+            query (dict): Parsed query parameters (optional)
+            headers (dict): Request headers (optional)
+
+        Returns:
+            ServiceResponse: 200 with the asset, 304 if the client copy is current, or 404
+        """
+        name = 'index.html' if path in ('/', '') else path.lstrip('/')
+        asset = self.get(name)
+        if asset is None:
+            return ServiceResponse.json(404, {'error': 'File not found'})
+
+        version = _first(query.get('v')) if query else None
+        cache_control = IMMUTABLE_CACHE_CONTROL if version == asset.fingerprint else REVALIDATE_CACHE_CONTROL
+
+        use_gzip = asset.gzip_content is not None and 'gzip' in (get_header(headers, 'Accept-Encoding') or '')
+        etag = asset.gzip_etag if use_gzip else asset.etag
+        response_headers = {
+            'ETag': etag,
+            'Cache-Control': cache_control,
+        }
+        if asset.gzip_content is not None:
+            response_headers['Vary'] = 'Accept-Encoding'
+
+        if etag_matches(get_header(headers, 'If-None-Match'), (asset.etag, asset.gzip_etag)):
+            return ServiceResponse(304, b'', response_headers)
+
+        response_headers['Content-Type'] = asset.content_type
+        if use_gzip:
+            response_headers['Content-Encoding'] = 'gzip'
+            return ServiceResponse(200, asset.gzip_content, response_headers)
+        return ServiceResponse(200, asset.content, response_headers)
+
+def _first(value):
+    """Query values come as lists from parse_qs and as strings from Vercel events"""
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+_cache = None
+
+def get_asset_cache():
+    """Return the process-wide asset cache, loading it on first use"""
+    global _cache
+    if _cache is None:
+        _cache = AssetCache()
+        count = _cache.load()
+        print(f"Loaded {count} static assets into memory")
+    return _cache
+
+def serve_static(path, query=None, headers=None):
+    """Serve a static file from the process-wide asset cache"""
+    return get_asset_cache().serve(path, query, headers)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Adaptive smoothing thresholds and threshold sweeps
+lowResUpscale and extraSmoothing compare neighbouring colours against fixed
+thresholds (DEFAULT_THRESHOLDS), which suit some palettes and not others. The
+analysis here takes one sweep over the image, building histograms of the
+colour distance between horizontally and vertically neighbouring pixels,
+splits the distances into shading steps and edges, and scales the defaults
+so that their level sits just above the image's shading steps.
+
+sweep() renders several threshold variants of one image. Stages whose inputs
+and thresholds coincide between variants (the 2x upscale, smooth for a
+repeated scale, a whole lowResUpscale pass for a repeated first pair) are run
+once and shared instead of running every variant from scratch.
+"""
+
+from engines import get_engine, Thresholds, DEFAULT_THRESHOLDS
+
+try:
+    import numpy as np
+except ImportError:
+    # The analysis falls back to a pure Python sweep
+    np = None
+
+# The defaults' level: lowResUpscale's leftoverPixels2 threshold, the
+# largest neighbour difference Project5's first pass blends
+DEFAULT_LEVEL = DEFAULT_THRESHOLDS.scale2
+
+# Below this many differing neighbour pairs the statistics are too thin to trust
+MIN_SAMPLES = 16
+
+# Bounds for the chosen level. Below MIN_LEVEL the pipeline would hardly
+# smooth at all; a lower class reaching past MAX_LEVEL is edges as well (art
+# with flat colours and no shading), where the defaults already keep every
+# edge sharp
+MIN_LEVEL = 6
+MAX_LEVEL = 60
+
+# Most variants one sweep renders
+MAX_SWEEP_VARIANTS = 8
+
+def neighbour_histograms(image):
+    """
+    Histogram the colour distances between neighbouring pixels.
+
+    The distance is the largest per-channel difference, which is what the
+    pipeline's threshold tests compare (every channel must be within range).
+
+    Args:
+        image (PIL.Image.Image): RGB image
+
+    Returns:
+        dict: 'horizontal' and 'vertical' lists of 256 pair counts by distance
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if np is not None:
+        a = np.asarray(image, dtype=np.int16)
+        horizontal = np.abs(a[:, 1:] - a[:, :-1]).max(axis=2)
+        vertical = np.abs(a[1:] - a[:-1]).max(axis=2)
+        return {
+            'horizontal': np.bincount(horizontal.ravel(), minlength=256).tolist(),
+            'vertical': np.bincount(vertical.ravel(), minlength=256).tolist(),
+        }
+
+    width, height = image.size
+    data = image.tobytes()
+    stride = width * 3
+    horizontal = [0] * 256
+    vertical = [0] * 256
+    for y in range(height):
+        row = y * stride
+        for i in range(row, row + stride, 3):
+            if i + 3 < row + stride:
+                horizontal[max(abs(data[i] - data[i + 3]), abs(data[i + 1] - data[i + 4]),
+                               abs(data[i + 2] - data[i + 5]))] += 1
+            if y + 1 < height:
+                j = i + stride
+                vertical[max(abs(data[i] - data[j]), abs(data[i + 1] - data[j + 1]),
+                             abs(data[i + 2] - data[j + 2]))] += 1
+    return {'horizontal': horizontal, 'vertical': vertical}
+
+def otsu_split(histogram):
+    """
+    Otsu's threshold for a histogram: the distance that best separates its
+    counts into two classes (maximum between-class variance).
+
+    Returns:
+        int: The first distance of the upper class, or None if the histogram
+            has fewer than two distinct values
+    """
+    total = sum(histogram)
+    weighted_total = sum(distance * count for distance, count in enumerate(histogram))
+    best, best_variance = None, 0.0
+    below = weighted_below = 0
+    for distance, count in enumerate(histogram[:-1]):
+        below += count
+        weighted_below += distance * count
+        above = total - below
+        if not below or not above:
+            continue
+        difference = weighted_below / below - (weighted_total - weighted_below) / above
+        variance = below * above * difference * difference
+        if variance > best_variance:
+            best, best_variance = distance + 1, variance
+    return best
+
+def choose_thresholds(histograms):
+    """
+    Pick thresholds from neighbour distance histograms.
+
+    Identical neighbours (distance 0) are left out: flat areas say nothing
+    about the palette. The Otsu split of the remaining distances separates
+    shading steps from edges, and the defaults are scaled, keeping their
+    proportions between stages, so that their level (lowResUpscale's scale2)
+    is just above the largest shading step.
+
+    Args:
+        histograms (dict): From neighbour_histograms
+
+    Returns:
+        tuple: (Thresholds, dict) the thresholds and the statistics behind them
+    """
+    combined = [h + v for h, v in zip(histograms['horizontal'], histograms['vertical'])]
+    combined[0] = 0
+    samples = sum(combined)
+    split = otsu_split(combined) if samples >= MIN_SAMPLES else None
+    # The threshold tests are strict (< scale2), so the level is one past the step
+    level = max(distance for distance in range(split) if combined[distance]) + 1 if split else None
+    stats = {'pairs': sum(histograms['horizontal']) + sum(histograms['vertical']), 'differing': samples,
+             'split': split, 'level': level}
+    if level is None or level > MAX_LEVEL:
+        return DEFAULT_THRESHOLDS, stats
+
+    factor = max(level, MIN_LEVEL) / DEFAULT_LEVEL
+    # The corner test compares against 3 * scale and pair differences reach 255
+    thresholds = Thresholds(*(min(max(1, round(value * factor)), limit)
+                              for value, limit in zip(DEFAULT_THRESHOLDS, (170, 256, 170, 256))))
+    return thresholds, stats
+
+def analyze(image):
+    """
+    Choose smoothing thresholds for an image in one pass over its pixels.
+
+    Args:
+        image (PIL.Image.Image): RGB image
+
+    Returns:
+        tuple: (Thresholds, dict) the thresholds and the statistics behind them
+    """
+    return choose_thresholds(neighbour_histograms(image))
+
+def parse_thresholds(value):
+    """
+    Parse a request's thresholds: "default", or a dict with any of scale,
+    scale2, extraScale and extraScale2 (the rest keep their defaults).
+
+    "auto" is left to the caller, since it needs the image.
+
+    Raises:
+        ValueError: If the value is not a valid set of thresholds
+    """
+    if value in (None, 'default'):
+        return DEFAULT_THRESHOLDS
+    if not isinstance(value, dict):
+        raise ValueError("thresholds must be \"auto\", \"default\" or {\"scale\", \"scale2\", \"extraScale\", \"extraScale2\"}")
+    fields = {'scale': 'scale', 'scale2': 'scale2', 'extraScale': 'extra_scale', 'extraScale2': 'extra_scale2'}
+    unknown = set(value) - set(fields)
+    if unknown:
+        raise ValueError(f"Unknown threshold fields: {', '.join(sorted(unknown))}")
+    thresholds = DEFAULT_THRESHOLDS._replace(**{fields[name]: value[name] for name in value})
+    for number in thresholds:
+        if not isinstance(number, int) or isinstance(number, bool) or not 0 <= number <= 256:
+            raise ValueError("Thresholds must be integers from 0 to 256")
+    return thresholds
+
+def thresholds_dict(thresholds):
+    """Thresholds as a JSON-friendly dict, in parse_thresholds's field names"""
+    return {
+        'scale': thresholds.scale,
+        'scale2': thresholds.scale2,
+        'extraScale': thresholds.extra_scale,
+        'extraScale2': thresholds.extra_scale2,
+    }
+
+def sweep(image, variants, engine_name=None, cancel_token=None):
+    """
+    Render highResUpscale for several thresholds, sharing common stages.
+
+    Args:
+        image (PIL.Image.Image): RGB image
+        variants (list): Thresholds to render
+        engine_name (str): Smoothing engine (optional, defaults to the selected one)
+        cancel_token (CancellationToken): Checked between stages (optional)
+
+    Returns:
+        tuple: (list, dict) one image per variant, in order, and counts of
+            stages run and shared
+    """
+    engine = get_engine(engine_name)
+    memo = {}
+    counts = {'variants': len(variants), 'stagesRun': 0, 'stagesShared': 0}
+
+    def cached(key, function, *args):
+        if key in memo:
+            counts['stagesShared'] += 1
+            return memo[key]
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        counts['stagesRun'] += 1
+        memo[key] = result = function(*args)
+        return result
+
+    def smoothing_pass(source, prefix, scale, scale2):
+        # The same stages as Engine._smoothing_pass, keyed by what they depend on
+        smoothed = cached(prefix + ('smooth', scale), engine.smooth, source, scale)
+        filled = cached(prefix + ('leftoverPixels', scale), engine.leftoverPixels, smoothed)
+        upscaled = cached(prefix + ('upscale',), engine.upscale, source)
+        averaged = cached(prefix + ('leftoverPixels2', scale2), engine.leftoverPixels2, upscaled, scale2)
+        return cached(prefix + ('overlay', scale, scale2), engine.overlay, filled, averaged)
+
+    results = []
+    for thresholds in variants:
+        low_prefix = ('low', thresholds.scale, thresholds.scale2)
+        low = smoothing_pass(image, (), thresholds.scale, thresholds.scale2)
+        extra = smoothing_pass(low, low_prefix, thresholds.extra_scale, thresholds.extra_scale2)
+        results.append(cached(low_prefix + ('brighten', thresholds.extra_scale, thresholds.extra_scale2),
+                              engine.brighten, extra))
+    return results, counts
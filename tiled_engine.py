@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tiled/parallel smoothing engine
+Splits each stage into horizontal bands with a halo of neighbouring rows and
+runs the bands on another engine in a process pool. Every stage is a local
+stencil, so a band computed from its halo-padded crop equals the same rows of
+the full-image result; the only non-local pixels are the wrapped last row
+that upscale copies from the first row, which is patched separately.
+"""
+
+import os
+
+from PIL import Image
+
+from engines import Engine, get_engine, map_in_pool
+
+# Bands smaller than this cost more to ship to a worker than to compute
+MIN_BAND_ROWS = int(os.environ.get('TILED_MIN_BAND_ROWS', 16))
+
+def _run_stage(engine_name, stage, images, args):
+    """Worker entry point: run one stage of a named engine on a band"""
+    return getattr(get_engine(engine_name), stage)(*images, *args)
+
+def _bands(height, count):
+    """Split [0, height) into count contiguous (start, stop) bands"""
+    step, extra = divmod(height, count)
+    bands = []
+    start = 0
+    for index in range(count):
+        stop = start + step + (1 if index < extra else 0)
+        bands.append((start, stop))
+        start = stop
+    return bands
+
+class TiledEngine(Engine):
+    """Runs each stage of an inner engine band by band in worker processes"""
+
+    name = 'tiled'
+
+    def __init__(self, inner=None, workers=None):
+        self.inner_name = inner or os.environ.get('TILED_INNER_ENGINE', 'buffer')
+        self.inner = get_engine(self.inner_name)
+        self.workers = workers or int(os.environ.get('TILED_WORKERS', os.cpu_count() or 1))
+
+    def _band_count(self, rows):
+        return max(1, min(self.workers, rows // MIN_BAND_ROWS))
+
+    def _map(self, stage, jobs, args=()):
+        """Run a stage on each list of band images, in parallel when possible"""
+        if len(jobs) == 1:
+            return [getattr(self.inner, stage)(*jobs[0], *args)]
+        return map_in_pool(_run_stage, [(self.inner_name, stage, images, args) for images in jobs],
+                           self.workers, 'Tiled engine')
+
+    def _stencil(self, stage, image, args=()):
+        """Run a 3x3 stencil stage band by band with one halo row each side"""
+        count = self._band_count(image.height)
+        if count == 1:
+            return getattr(self.inner, stage)(image, *args)
+        bands = _bands(image.height, count)
+        crops = []
+        for start, stop in bands:
+            top, bottom = max(start - 1, 0), min(stop + 1, image.height)
+            crops.append([image.crop((0, top, image.width, bottom))])
+        results = self._map(stage, crops, args)
+        out = Image.new('RGB', image.size)
+        for (start, stop), result in zip(bands, results):
+            top = max(start - 1, 0)
+            out.paste(result.crop((0, start - top, image.width, stop - top)), (0, start))
+        return out
+
+    def _pointwise(self, stage, images):
+        count = self._band_count(images[0].height)
+        if count == 1:
+            return getattr(self.inner, stage)(*images)
+        bands = _bands(images[0].height, count)
+        jobs = [[image.crop((0, start, image.width, stop)) for image in images] for start, stop in bands]
+        out = Image.new('RGB', images[0].size)
+        for (start, stop), result in zip(bands, self._map(stage, jobs)):
+            out.paste(result, (0, start))
+        return out
+
+    def upscale(self, image):
+        # Cheap compared with the other stages; keeping it whole preserves the wrap
+        return self.inner.upscale(image)
+
+    def smooth(self, image, scale):
+        count = self._band_count(image.height)
+        if count == 1:
+            return self.inner.smooth(image, scale)
+        # Input rows [start, stop) own output rows [2*start, 2*stop); computing
+        # them needs input rows start-1 .. stop+1
+        bands = _bands(image.height, count)
+        crops = []
+        for start, stop in bands:
+            top, bottom = max(start - 1, 0), min(stop + 2, image.height)
+            crops.append([image.crop((0, top, image.width, bottom))])
+        results = self._map('smooth', crops, (scale,))
+        out = Image.new('RGB', (image.width * 2, image.height * 2))
+        for (start, stop), result in zip(bands, results):
+            offset = 2 * max(start - 1, 0)
+            out.paste(result.crop((0, 2 * start - offset, result.width, 2 * stop - offset)), (0, 2 * start))
+        # The last output row is never smoothed and wraps around to input row 0
+        first_row = self.inner.upscale(image.crop((0, 0, image.width, 1)))
+        out.paste(first_row.crop((0, 0, first_row.width, 1)), (0, out.height - 1))
+        return out
+
+    def leftoverPixels(self, image):
+        return self._stencil('leftoverPixels', image)
+
+    def leftoverPixels2(self, image, scale2):
+        return self._stencil('leftoverPixels2', image, (scale2,))
+
+    def overlay(self, image1, image2):
+        return self._pointwise('overlay', [image1, image2])
+
+    def brighten(self, image):
+        return self._pointwise('brighten', [image])
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Warm-start cache for the serverless functions
+Heavy imports (Project5, Pillow) are deferred until the first request and
+precomputed lookup tables live in module-level state, so a warm instance
+reuses them across invocations instead of rebuilding them.
+"""
+
+import os
+import time
+import importlib
+
+# Recorded as early as possible so the cold-start time covers how long the
+# instance spent getting ready
+_LOAD_STARTED = time.perf_counter()
+
+_modules = {}
+_tables = {}
+_table_builders = {}
+_state = {
+    'invocations': 0,
+    'load_ms': None,
+    'cold_start_ms': None,
+    'warmed_up': False,
+}
+
+def lazy_import(module_name):
+    """
+    Import a module on first use and keep it for later invocations.
+
+    Args:
+        module_name (str): Dotted module name, e.g. 'PIL.Image'
+
+    Returns:
+        module: The imported module
+    """
+    module = _modules.get(module_name)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        _modules[module_name] = module
+        print(f"Imported {module_name} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return module
+
+def get_pipeline():
+    """Return the Project5 module, importing it on first use"""
+    return lazy_import('Project5')
+
+def get_pil_image():
+    """Return PIL.Image, importing it on first use"""
+    return lazy_import('PIL.Image')
+
+def register_table(name, builder):
+    """
+    Register a lookup table builder.
+
+    The table is built the first time it is requested (or during warm_up)
+    and then kept for the lifetime of the instance.
+
+    Args:
+        name (str): Table name
+        builder (callable): Zero-argument function returning the table
+    """
+    _table_builders[name] = builder
+
+def get_table(name, builder=None):
+    """
+    Get a precomputed lookup table, building it on first use.
+
+    Args:
+        name (str): Table name
+        builder (callable): Builder to register if the name is unknown (optional)
+
+    Returns:
+        The table returned by its builder
+    """
+    table = _tables.get(name)
+    if table is None:
+        if builder is not None and name not in _table_builders:
+            _table_builders[name] = builder
+        if name not in _table_builders:
+            raise KeyError(f"Unknown lookup table: {name}")
+        table = _table_builders[name]()
+        _tables[name] = table
+    return table
+
+def warm_up(modules=('PIL.Image', 'Project5')):
+    """
+    Import heavy modules and build all registered tables ahead of the first request.
+
+    Args:
+        modules (tuple): Module names to import
+
+    Returns:
+        dict: Warm-up timing report
+    """
+    # Warm-up on load runs before the function module finishes loading
+    mark_loaded()
+    started = time.perf_counter()
+    for module_name in modules:
+        lazy_import(module_name)
+    for name in list(_table_builders):
+        get_table(name)
+    _state['warmed_up'] = True
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    mark_ready(elapsed_ms)
+    print(f"Warm-up complete in {elapsed_ms:.1f} ms")
+    return {
+        'warmupMs': round(elapsed_ms, 1),
+        'modules': sorted(_modules),
+        'tables': sorted(_tables),
+    }
+
+def mark_loaded():
+    """Record that the function module has finished loading (call at the end of its imports)"""
+    if _state['load_ms'] is None:
+        _state['load_ms'] = (time.perf_counter() - _LOAD_STARTED) * 1000
+
+def mark_ready(setup_ms=0.0):
+    """
+    Stop the cold-start clock, if it is still running.
+
+    The instance is ready after warm_up() or once it has served its first
+    request of any kind. The cold-start time is the module load time plus
+    setup_ms, the work that request (or warm-up) did to get ready, so time
+    spent idle before it or after it never counts.
+
+    Args:
+        setup_ms (float): Time the caller spent loading the pipeline
+
+    Returns:
+        float: Cold-start time in milliseconds if this call stopped the clock, else None
+    """
+    if _state['cold_start_ms'] is not None:
+        return None
+    mark_loaded()
+    _state['cold_start_ms'] = round(_state['load_ms'] + setup_ms, 1)
+    print(f"Cold start: {_state['cold_start_ms']} ms")
+    return _state['cold_start_ms']
+
+def record_invocation():
+    """
+    Count a processing invocation, loading the pipeline on the first one.
+
+    Returns:
+        float: Cold-start time in milliseconds if this invocation finished
+            getting the instance ready, else None
+    """
+    _state['invocations'] += 1
+    started = time.perf_counter()
+    if _state['invocations'] == 1:
+        get_pil_image()
+        get_pipeline()
+    return mark_ready((time.perf_counter() - started) * 1000)
+
+def cold_start_headers(cold_start_ms):
+    """Response headers reporting the cold-start time, if any"""
+    if cold_start_ms is None:
+        return {}
+    return {'X-Cold-Start-Ms': str(cold_start_ms)}
+
+def report():
+    """Return a snapshot of the warm cache state"""
+    return {
+        'invocations': _state['invocations'],
+        'coldStartMs': _state['cold_start_ms'],
+        'warmedUp': _state['warmed_up'],
+        'modules': sorted(_modules),
+        'tables': sorted(_tables),
+    }
+
+def is_warmup_event(event):
+    """Check whether a Vercel event is a warm-up ping (GET ?warmup=1)"""
+    if event.get('httpMethod', 'GET') != 'GET':
+        return False
+    query = event.get('queryStringParameters') or {}
+    return str(query.get('warmup', '')).lower() in ('1', 'true', 'yes')
+
+# Optionally warm up while the instance is being initialised
+if os.environ.get('WARM_UP_ON_LOAD', '').lower() in ('1', 'true', 'yes'):
+    warm_up()